@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""
+cache.py: defines a fitness cache for Eclypse
+"""
+
+import pickle
+from collections import OrderedDict
+
+
+#############################################################################
+#
+# FitnessCache
+#
+#############################################################################
+class FitnessCache():
+    """
+    Remembers the fitness of genomes that have already been evaluated, so
+    that identical genomes (e.g. clones that made it through crossover and
+    mutation unchanged) don't have to be evaluated again.
+
+    Genomes are looked up by the key returned from the coder's genome_key()
+    method.  When the cache is full, the least recently used entry is
+    discarded.  The same cache can be kept from one generation to the next,
+    and can be written to disk with save() and read back in with load() in
+    order to share it between runs.
+
+    Note that this only makes sense for problems with deterministic fitness
+    functions.
+    """
+    def __init__(self, capacity=100000):
+        """
+        @param capacity: The maximum number of fitness values stored.  If
+                         None, the cache will grow without bound.
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """
+        Returns the fitness stored for key, or None if there isn't one.
+        """
+        try:
+            fitness = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, key, fitness):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        if self.capacity is not None:
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return float(self.hits) / lookups
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            pickle.dump(list(self.entries.items()), f)
+
+    def load(self, filename):
+        """
+        Adds the entries stored in filename by save() to this cache.
+        """
+        with open(filename, "rb") as f:
+            for key, fitness in pickle.load(f):
+                self.put(key, fitness)
+
+
+#############################################################################
+#
+# unit_test
+#
+#############################################################################
+if __name__ == "__main__":
+    cache = FitnessCache(capacity=2)
+    cache.put(b"a", 1)
+    cache.put(b"b", 2)
+    cache.get(b"a")
+    cache.put(b"c", 3)   # b is evicted
+
+    assert(cache.get(b"b") is None)
+    assert(cache.get(b"a") == 1)
+    assert(cache.hits == 2 and cache.misses == 1)
+    print("passed")
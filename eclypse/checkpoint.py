@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+
+"""
+checkpoint.py: saves and restores the state of a run for Eclypse
+"""
+
+import os
+import json
+import random
+
+import numpy as np
+
+from eclypse.ind import Individual
+from eclypse.population import fitness_type
+
+
+#############################################################################
+#
+# File format
+#
+# A checkpoint is a single file:
+#
+#   MAGIC                  8 bytes
+#   header length          8 bytes, little endian
+#   header                 JSON, padded to a multiple of ALIGNMENT
+#   arrays                 raw array data, each starting at a multiple of
+#                          ALIGNMENT
+#
+# The header records the generation, configuration and RNG scalars, along
+# with the offset, dtype and shape of each array.  Since the arrays are
+# stored raw at aligned offsets, they can be memory mapped when the file is
+# loaded rather than read in.  Nothing is pickled, so the problem (which may
+# hold things like simulators) never has to be stored.
+#
+# Genomes that are all numpy arrays of the same shape are stacked into a
+# single array.  Anything else must be (possibly nested) lists or tuples,
+# which are stored as a flat array of leaf genes along with one offsets
+# array per level of nesting, so ragged genomes (e.g. Pitt rule sets) take
+# no more room than their genes.
+#
+#############################################################################
+MAGIC = b"ECLYPSE\x01"
+ALIGNMENT = 64
+
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+#############################################################################
+#
+# Genome encoding
+#
+#############################################################################
+def encode_genomes(genomes, dtype=None):
+    """
+    Converts a list of genomes into a description (for the header) and a
+    dictionary of arrays.  See the notes on the file format above.
+    """
+    first = genomes[0]
+    if isinstance(first, np.ndarray) and \
+       all(isinstance(g, np.ndarray) and g.shape == first.shape
+           for g in genomes):
+        order = "F" if first.ndim > 1 and first.flags.f_contiguous and \
+                       not first.flags.c_contiguous else "C"
+        return {"kind": "array", "order": order}, \
+               {"genomes": np.stack(genomes)}
+
+    # Find how deeply the lists are nested, and what kind they are
+    containers = []
+    g = first
+    while type(g) in (list, tuple):
+        containers.append(type(g).__name__)
+        if len(g) == 0:
+            break
+        g = g[0]
+
+    arrays = {}
+    items = genomes
+    for level in range(len(containers)):
+        lengths = np.fromiter((len(item) for item in items), dtype=np.int64,
+                              count=len(items))
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        arrays["offsets%d" % level] = offsets
+        items = [gene for item in items for gene in item]
+
+    if items and isinstance(items[0], np.ndarray):
+        leaves = np.stack(items)
+        leaf_order = "F" if leaves.ndim > 2 and \
+                            items[0].flags.f_contiguous and \
+                            not items[0].flags.c_contiguous else "C"
+    else:
+        leaves = np.asarray(items, dtype=dtype)
+        leaf_order = None
+    arrays["genes"] = leaves
+
+    return {"kind": "ragged", "containers": containers,
+            "leaf_arrays": leaf_order is not None,
+            "leaf_order": leaf_order}, arrays
+
+
+def decode_genomes(description, arrays):
+    """
+    The reverse of encode_genomes().  The genomes returned are independent
+    copies, even if the arrays are memory mapped.
+    """
+    if description["kind"] == "array":
+        order = description["order"]
+        return [np.array(g, order=order) for g in arrays["genomes"]]
+
+    genes = arrays["genes"]
+    if description["leaf_arrays"]:
+        order = description["leaf_order"]
+        items = [np.array(g, order=order) for g in genes]
+    else:
+        items = genes.tolist()
+
+    containers = description["containers"]
+    for level in reversed(range(len(containers))):
+        offsets = arrays["offsets%d" % level].tolist()
+        container = tuple if containers[level] == "tuple" else list
+        items = [container(items[start:stop])
+                 for start, stop in zip(offsets[:-1], offsets[1:])]
+    return items
+
+
+#############################################################################
+#
+# describe_pipeline
+#
+#############################################################################
+def describe_pipeline(op):
+    """
+    Returns a JSON friendly description of a pipeline: the class name and
+    simple parameters of each operator, starting with op and following the
+    providers.  This is stored in checkpoints as a record of how the run was
+    configured.
+    """
+    description = []
+    while op is not None:
+        params = {name: value for name, value in vars(op).items()
+                  if type(value) in (int, float, str, bool)}
+        description.append({"op": type(op).__name__, "params": params})
+        op = getattr(op, "provider", None)
+    return description
+
+
+#############################################################################
+#
+# save_checkpoint
+#
+#############################################################################
+def save_checkpoint(filename, population, generation, config=None,
+                    best=None):
+    """
+    Writes the population, the generation number, the state of the python
+    and numpy random number generators, and a configuration dictionary to
+    filename.
+
+    The file is written under a temporary name and then renamed, so a crash
+    part way through never leaves a damaged checkpoint behind.
+
+    @param population: A list of Individuals.  They must all share the same
+                       coder.
+    @param generation: The number of the generation just completed.
+    @param config: Anything else that should be saved with the run, such as
+                   the parameters or a description of the pipeline.  It must
+                   be JSON serializable.
+    @param best: An optional Individual, such as the best so far, to save
+                 along with the population.  It is stored after the last
+                 member of the population.
+    """
+    individuals = list(population)
+    if best is not None:
+        individuals.append(best)
+
+    coder = individuals[0].genetic_coder
+    genome_description, arrays = encode_genomes(
+                                     [ind.genome for ind in individuals],
+                                     coder.genome_dtype)
+
+    # Numeric fitnesses go in an array.  Integers are stored as floats
+    # (exact up to 2**53), and converted back when loaded.
+    fitness = [ind.fitness for ind in individuals]
+    fitness_type_name = None
+    if all(f is None or isinstance(f, (int, float, np.number))
+           for f in fitness):
+        fitness_type_name = fitness_type(fitness).__name__
+        arrays["fitness"] = np.array([np.nan if f is None else f
+                                      for f in fitness], dtype=float)
+        fitness = None
+    arrays["modified"] = np.array([ind.modified for ind in individuals],
+                                  dtype=bool)
+
+    version, py_state, gauss_next = random.getstate()
+    arrays["python_rng"] = np.array(py_state, dtype=np.uint32)
+    np_name, np_keys, np_pos, np_has_gauss, np_gauss = np.random.get_state()
+    arrays["numpy_rng"] = np_keys
+
+    header = {"generation": generation,
+              "config": config or {},
+              "genomes": genome_description,
+              "fitness": fitness,     # Only if it can't be an array
+              "fitness_type": fitness_type_name,
+              "best": best is not None,
+              "python_rng": [version, gauss_next],
+              "numpy_rng": [np_name, np_pos, np_has_gauss, np_gauss],
+              "arrays": {}}
+
+    # The header has to hold the array offsets, which depend on its own
+    # length.  Leave some room to spare, and try again if it isn't enough.
+    header_space = ALIGNMENT
+    while True:
+        offset = header_space
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            arrays[name] = array
+            header["arrays"][name] = {"offset": offset,
+                                      "dtype": array.dtype.str,
+                                      "shape": list(array.shape)}
+            offset = align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode()
+        if len(MAGIC) + 8 + len(header_bytes) <= header_space:
+            break
+        header_space = align(len(MAGIC) + 8 + len(header_bytes) + 256)
+
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_filename, filename)
+
+
+#############################################################################
+#
+# Checkpoint
+#
+#############################################################################
+class Checkpoint():
+    """
+    A checkpoint file that has been opened with load_checkpoint().  The
+    arrays are memory mapped, so only the parts that are used get read.
+    """
+    def __init__(self, filename, header, arrays):
+        self.filename = filename
+        self.header = header
+        self.arrays = arrays
+
+    @property
+    def generation(self):
+        return self.header["generation"]
+
+    @property
+    def config(self):
+        return self.header["config"]
+
+    def genomes(self):
+        return decode_genomes(self.header["genomes"], self.arrays)
+
+    def fitness(self):
+        if self.header["fitness"] is not None:
+            return self.header["fitness"]
+        convert = int if self.header.get("fitness_type") == "int" else float
+        return [None if np.isnan(f) else convert(f)
+                for f in self.arrays["fitness"].tolist()]
+
+    def all_individuals(self, problem, genetic_coder):
+        individuals = []
+        for genome, fitness, modified in zip(self.genomes(), self.fitness(),
+                                             self.arrays["modified"].tolist()):
+            ind = Individual(problem, genetic_coder, genome)
+            ind.fitness = fitness
+            ind.modified = modified
+            individuals.append(ind)
+        return individuals
+
+    def individuals(self, problem, genetic_coder):
+        """
+        Rebuilds the population using the given problem and coder.
+        """
+        individuals = self.all_individuals(problem, genetic_coder)
+        if self.header.get("best"):
+            individuals.pop()
+        return individuals
+
+    def best(self, problem, genetic_coder):
+        """
+        Returns the Individual saved with the best argument of
+        save_checkpoint(), or None if there wasn't one.
+        """
+        if not self.header.get("best"):
+            return None
+        return self.all_individuals(problem, genetic_coder)[-1]
+
+    def restore_rng(self):
+        """
+        Puts the python and numpy random number generators back into the
+        state they were in when the checkpoint was saved.
+        """
+        version, gauss_next = self.header["python_rng"]
+        random.setstate((version,
+                         tuple(self.arrays["python_rng"].tolist()),
+                         gauss_next))
+        np_name, np_pos, np_has_gauss, np_gauss = self.header["numpy_rng"]
+        np.random.set_state((np_name, np.array(self.arrays["numpy_rng"]),
+                             np_pos, np_has_gauss, np_gauss))
+
+
+#############################################################################
+#
+# load_checkpoint
+#
+#############################################################################
+def load_checkpoint(filename):
+    """
+    Opens a checkpoint written by save_checkpoint().
+
+    @return: A Checkpoint.
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not an Eclypse checkpoint" % filename)
+        header_length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_length).decode())
+
+    arrays = {}
+    for name, info in header["arrays"].items():
+        shape = tuple(info["shape"])
+        if 0 in shape:     # mmap can't map an empty region
+            arrays[name] = np.empty(shape, dtype=info["dtype"])
+        else:
+            arrays[name] = np.memmap(filename, dtype=info["dtype"], mode="r",
+                                     offset=info["offset"], shape=shape)
+    return Checkpoint(filename, header, arrays)
+
+
+#############################################################################
+#
+# unit_test
+#
+#############################################################################
+if __name__ == "__main__":
+    import tempfile
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+
+    problem = SimilarityProblem([1,1,1,1,1])  # OneMax
+    coder = BinaryCoder(5)
+    population = [Individual(problem, coder) for _ in range(10)]
+    for ind in population:
+        ind.evaluate()
+
+    filename = os.path.join(tempfile.mkdtemp(), "run.ckpt")
+    save_checkpoint(filename, population, 3)
+    checkpoint = load_checkpoint(filename)
+    restored = checkpoint.individuals(problem, coder)
+
+    assert(checkpoint.generation == 3)
+    assert([ind.genome for ind in restored] ==
+           [ind.genome for ind in population])
+    assert([ind.fitness for ind in restored] ==
+           [ind.fitness for ind in population])
+    print("passed")
@@ -7,7 +7,79 @@ coders.py: defines coder classes for Eclypse
 import random
 import copy
 import math
+import hashlib
+import operator
 
+import numpy as np
+
+from eclypse.ind import genome_size
+
+
+
+#############################################################################
+#
+# canonical_genome
+#
+#############################################################################
+def canonical_genome(gene_or_genome):
+    """
+    A helper function.  Converts a genome (or part of one) into nested tuples
+    of plain python values, so that equivalent genomes look the same no
+    matter how they are stored.
+    """
+    if isinstance(gene_or_genome, np.ndarray):
+        gene_or_genome = gene_or_genome.tolist()
+    if isinstance(gene_or_genome, (list, tuple)):
+        return tuple(canonical_genome(g) for g in gene_or_genome)
+    if isinstance(gene_or_genome, np.generic):
+        return gene_or_genome.item()
+    return gene_or_genome
+
+
+#############################################################################
+#
+# Genome copiers
+#
+# Fast copy functions for the common genome layouts.  Coders declare which
+# one applies to their genomes with the genome_layout class attribute, and
+# BaseCoder.copy_genome() uses it.  These are much faster than deepcopy,
+# which has to discover the structure every time and keep a memo of
+# everything it has seen.
+#
+#############################################################################
+def copy_flat_genome(genome):
+    """
+    Copies a sequence of immutable genes (e.g. numbers).
+    """
+    if type(genome) is list:
+        return genome[:]
+    if isinstance(genome, np.ndarray):
+        return genome.copy(order="K")   # slicing would just make a view
+    return copy.copy(genome)
+
+
+def copy_list_of_tuples(genome):
+    """
+    Copies a list of tuples.  Tuples are immutable, so they can be shared.
+    """
+    return list(genome)
+
+
+def copy_list_of_lists(genome):
+    """
+    Copies a list of flat sequences, such as a Pitt approach rule set.
+    """
+    if genome and type(genome[0]) is list:
+        return [g[:] for g in genome]
+    return [copy_flat_genome(g) for g in genome]
+
+
+GENOME_COPIERS = {
+    "flat": copy_flat_genome,
+    "list_of_tuples": copy_list_of_tuples,
+    "list_of_lists": copy_list_of_lists,
+    "ndarray": copy_flat_genome,
+}
 
 
 #############################################################################
@@ -33,20 +105,60 @@ import math
 #
 #############################################################################
 class BaseCoder():
+    # The numpy dtype used when genomes are stored in a Population array.
+    # None lets numpy decide.
+    genome_dtype = None
+
+    # The structure of the genomes, which determines how copy_genome() copies
+    # them.  One of the keys of GENOME_COPIERS, or None if the structure is
+    # unknown.
+    genome_layout = None
+
     def create_random_genome(self):
         raise NotImplementedError
     
     def decode_genome(self, genome):
         raise NotImplementedError
 
+    def decode_population(self, genomes):
+        """
+        Decodes a sequence of genomes (e.g. the rows of a Population's genome
+        array) and returns a sequence of phenomes.  Subclasses can override
+        this with something faster than decoding one genome at a time.
+        """
+        return [self.decode_genome(genome) for genome in genomes]
+
     def copy_genome(self, genome):
         """
         Returns a copy of the given genome.
-        The default here is to use deepcopy, but this can be VERY time
-        consuming, so it really pays to override this function with something
-        geared towards your specific representation.
+        If the coder declares a genome_layout, the matching function from
+        GENOME_COPIERS is used.  Otherwise this falls back to deepcopy, which
+        can be VERY time consuming, so it really pays to declare a layout or
+        override this function with something geared towards your specific
+        representation.
         """
-        return copy.deepcopy(genome)
+        copier = GENOME_COPIERS.get(self.genome_layout)
+        if copier is None:
+            return copy.deepcopy(genome)
+        return copier(genome)
+
+    def count_genes(self, genome):
+        """
+        Returns the number of genes in the genome.  Flat genomes just need
+        their length.  Anything else has to be walked with genome_size().
+        """
+        if self.genome_layout == "flat":
+            return len(genome)
+        return genome_size(genome)
+
+    def genome_key(self, genome):
+        """
+        Returns a compact, hashable key for the genome.  Genomes containing
+        the same genes will have the same key, even across runs, which makes
+        it suitable for use with a FitnessCache.
+        """
+        data = repr(canonical_genome(genome)).encode()
+        return hashlib.blake2b(data, digest_size=16).digest()
 
 
 #############################################################################
@@ -55,6 +167,9 @@ class BaseCoder():
 #
 #############################################################################
 class BinaryCoder(BaseCoder):
+    genome_dtype = np.int8
+    genome_layout = "flat"
+
     def __init__(self, genome_size):
         self.genome_size = genome_size
     
@@ -64,8 +179,111 @@ class BinaryCoder(BaseCoder):
     def decode_genome(self, genome):
         return genome   # the genome is the phenome
 
-    def copy_genome(self, genome):
-        return genome[:]
+    def genome_key(self, genome):
+        data = np.asarray(genome, dtype=np.uint8).tobytes()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+
+#############################################################################
+#
+# popcount
+#
+#############################################################################
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)],
+                           dtype=np.uint8)
+
+def popcount(words, axis=None):
+    """
+    Counts the number of bits that are set in an array of uint8 words.
+    """
+    if hasattr(np, "bitwise_count"):   # numpy 2.0 and later
+        counts = np.bitwise_count(words)
+    else:
+        counts = _POPCOUNT_TABLE[words]
+    return counts.sum(axis=axis, dtype=np.int64)
+
+
+#############################################################################
+#
+# PackedBits
+#
+#############################################################################
+class PackedBits():
+    """
+    The phenome produced by the PackedBinaryCoder.  It holds the packed
+    words along with the number of bits they represent, so that problems
+    that know about it (such as SimilarityProblem) can work on the words
+    directly.  It also acts like a sequence of bits for problems that don't.
+    """
+    def __init__(self, words, num_bits):
+        self.words = words
+        self.num_bits = num_bits
+
+    def unpack(self):
+        return np.unpackbits(self.words, count=self.num_bits)
+
+    def __len__(self):
+        return self.num_bits
+
+    def __iter__(self):
+        return iter(self.unpack().tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.unpack()[index]
+        # Read the one bit from its word, rather than unpacking them all
+        index = operator.index(index)
+        if index < 0:
+            index += self.num_bits
+        if not 0 <= index < self.num_bits:
+            raise IndexError("PackedBits index out of range")
+        return (int(self.words[index >> 3]) >> (7 - (index & 7))) & 1
+
+
+#############################################################################
+#
+# PackedBinaryCoder
+#
+#############################################################################
+class PackedBinaryCoder(BaseCoder):
+    """
+    Stores a binary genome as a numpy array of uint8 words, 8 bits to a
+    word, most significant bit first (i.e. np.packbits order).  Any unused
+    bits at the end of the last word are always zero.
+
+    This takes an eighth of a byte per bit rather than the 8+ bytes per bit
+    of a python list, and allows whole words to be operated on at once.  Use
+    it with the PackedBitFlipMutation and PackedUniformCrossover operators.
+    """
+    genome_dtype = np.uint8
+    genome_layout = "ndarray"
+
+    def __init__(self, genome_size):
+        self.genome_size = genome_size
+        self.num_words = (genome_size + 7) // 8
+
+    def pack(self, bits):
+        return np.packbits(np.asarray(bits, dtype=bool))
+
+    def unpack(self, genome):
+        return np.unpackbits(genome, count=self.genome_size)
+
+    def create_random_genome(self):
+        data = random.getrandbits(8 * self.num_words)
+        genome = np.frombuffer(data.to_bytes(self.num_words, "big"),
+                               dtype=np.uint8).copy()
+        num_unused = 8 * self.num_words - self.genome_size
+        genome[-1] &= (0xff << num_unused) & 0xff
+        return genome
+
+    def decode_genome(self, genome):
+        return PackedBits(genome, self.genome_size)
+
+    def count_genes(self, genome):
+        return self.genome_size
+
+    def genome_key(self, genome):
+        return hashlib.blake2b(genome.tobytes(), digest_size=16).digest()
 
 
 #############################################################################
@@ -74,25 +292,39 @@ class BinaryCoder(BaseCoder):
 #
 #############################################################################
 class Binary2FloatCoder(BinaryCoder):
+    """
+    Each float is encoded using a fixed number of bits.  Decoding is done
+    with numpy, either for a single genome or for a whole population at
+    once with decode_population().
+    """
     def __init__(self, bits_per_float_list, float_bounds):
         assert(len(bits_per_float_list) == len(float_bounds))
         super().__init__(genome_size=sum(bits_per_float_list))
         self.bits_per_float_list = bits_per_float_list
         self.float_bounds = float_bounds
 
+        # Precalculate what we need for decoding.  Each bit is weighted so
+        # that the weighted sum of a field is ival / 2**n_bits.
+        self.bit_offsets = np.cumsum([0] + list(bits_per_float_list[:-1]))
+        self.bit_weights = np.concatenate([2.0 ** -np.arange(1, n_bits + 1)
+                                           for n_bits in bits_per_float_list])
+        self.lower_bounds = np.array([b[0] for b in float_bounds], dtype=float)
+        self.scales = np.array([b[1] - b[0] for b in float_bounds],
+                               dtype=float)
+
     def decode_genome(self, genome):
-        bit_offset = 0
-        phenome = []
-        for n_bits, bound in zip(self.bits_per_float_list, self.float_bounds):
-            bits = genome[bit_offset : bit_offset + n_bits]
-            max_ival = 2 ** len(bits)
-            ival = self.binary2int(bits)
-            fval = (float(ival) / max_ival) * (bound[1]-bound[0]) + bound[0]
-
-            bit_offset += n_bits
-            phenome.append(fval)
-
-        return phenome
+        genomes = np.asarray(genome)[np.newaxis, :]
+        return self.decode_population(genomes)[0].tolist()
+
+    def decode_population(self, genomes):
+        """
+        Decodes an (N, L) array of bits into an (N, V) array of floats, where
+        V is the number of floats per genome.
+        """
+        bits = np.asarray(genomes)
+        fractions = np.add.reduceat(bits * self.bit_weights, self.bit_offsets,
+                                    axis=1)
+        return fractions * self.scales + self.lower_bounds
             
     def binary2int(self, binary_list):
         binary_str = "".join(str(x) for x in binary_list)
@@ -105,7 +337,94 @@ class Binary2FloatCoder(BinaryCoder):
 #
 #############################################################################
 class GrayBinary2FloatCoder(Binary2FloatCoder):
-   def binary2int(self, gray_binary_list):
+    """
+    Decoding is done with lookup tables.  For fields of up to
+    max_table_bits bits, the Gray coded bits are packed into an index into a
+    table of float values, so each float takes a single lookup.  Wider
+    fields are split into chunks, and each chunk is converted from Gray to
+    binary with a smaller table.
+
+    The tables are stored at the class level, so they are shared by every
+    coder with the same field sizes and bounds.
+    """
+    max_table_bits = 16
+
+    _float_tables = {}   # (n_bits, bound) -> table of floats
+    _chunk_tables = {}   # n_bits -> table of Gray to binary integers
+
+    @classmethod
+    def gray_to_int_table(cls, n_bits):
+        """
+        Returns an array mapping every n_bits Gray code to its integer value.
+        """
+        table = cls._chunk_tables.get(n_bits)
+        if table is None:
+            # Each binary bit is the XOR of the Gray bits above it, so
+            # XORing in ever larger shifts does the whole conversion.
+            table = np.arange(2 ** n_bits, dtype=np.int64)
+            shift = 1
+            while shift < n_bits:
+                table ^= table >> shift
+                shift *= 2
+            cls._chunk_tables[n_bits] = table
+        return table
+
+    @classmethod
+    def float_table(cls, n_bits, bound):
+        """
+        Returns an array mapping every n_bits Gray code to its float value.
+        """
+        key = (n_bits, tuple(bound))
+        table = cls._float_tables.get(key)
+        if table is None:
+            ivals = cls.gray_to_int_table(n_bits)
+            table = (ivals.astype(float) / 2 ** n_bits) * \
+                    (bound[1] - bound[0]) + bound[0]
+            cls._float_tables[key] = table
+        return table
+
+    def decode_population(self, genomes):
+        bits = np.asarray(genomes)
+        phenomes = np.empty((len(bits), len(self.bits_per_float_list)))
+        for i, (n_bits, bound) in enumerate(zip(self.bits_per_float_list,
+                                                self.float_bounds)):
+            offset = self.bit_offsets[i]
+            field = bits[:, offset : offset + n_bits]
+            if n_bits <= self.max_table_bits:
+                table = self.float_table(n_bits, bound)
+                phenomes[:, i] = table[self.pack_index(field)]
+            else:
+                fractions = self.chunked_fractions(field)
+                phenomes[:, i] = fractions * (bound[1] - bound[0]) + bound[0]
+        return phenomes
+
+    def pack_index(self, bits):
+        """
+        Converts an (N, n_bits) array of bits into a vector of integers.
+        """
+        powers = 1 << np.arange(bits.shape[1] - 1, -1, -1, dtype=np.int64)
+        return bits.astype(np.int64) @ powers
+
+    def chunked_fractions(self, field):
+        """
+        Converts a wide field of Gray coded bits into ival / 2**n_bits.  The
+        table gives the binary value of a chunk assuming the bit before it is
+        zero.  If it was a one instead, the chunk's binary bits are all
+        inverted.
+        """
+        n_bits = field.shape[1]
+        fractions = np.zeros(len(field))
+        prev_bit = np.zeros(len(field), dtype=np.int64)
+        for start in range(0, n_bits, self.max_table_bits):
+            chunk = field[:, start : start + self.max_table_bits]
+            width = chunk.shape[1]
+            ivals = self.gray_to_int_table(width)[self.pack_index(chunk)]
+            ivals ^= prev_bit * ((1 << width) - 1)
+            prev_bit = ivals & 1
+            fractions += ivals * 2.0 ** -(start + width)
+        return fractions
+
+    def binary2int(self, gray_binary_list):
         ival = 0
         prev_bit = 0
         for gray_bit in gray_binary_list:
@@ -121,6 +440,9 @@ class GrayBinary2FloatCoder(Binary2FloatCoder):
 #
 #############################################################################
 class FloatCoder(BaseCoder):
+    genome_dtype = float
+    genome_layout = "flat"
+
     def __init__(self, init_ranges):
         self.init_ranges = init_ranges
     
@@ -130,9 +452,6 @@ class FloatCoder(BaseCoder):
     def decode_genome(self, genome):
         return genome   # the genome is the phenome
 
-    def copy_genome(self, genome):
-        return genome[:]
-
 
 #############################################################################
 #
@@ -141,11 +460,18 @@ class FloatCoder(BaseCoder):
 #############################################################################
 class AdaptiveFloatCoder(FloatCoder):
     """
-    Defines each gene as a tuple containing two values: the gene value
-    itself, and the mutation sigma (standard deviation) value used by the
-    AdaptiveMutation operator.  Thus the genome is defined as an
-    array of these tuples.
+    Defines each gene as a pair of values: the gene value itself, and the
+    mutation sigma (standard deviation) value used by the AdaptiveMutation
+    operator.
+
+    The genome is a numpy array of shape (num_genes, 2), so genome[i] is
+    still the (value, sigma) pair for gene i.  It is stored in column major
+    (Fortran) order though, which means genome[:, 0] (the values) and
+    genome[:, 1] (the sigmas) are each contiguous arrays.  This lets
+    AdaptiveMutation work on all the genes at once.
     """
+    genome_layout = "ndarray"
+
     def __init__(self, init_ranges, init_sigmas=None):
         """
         The init_ranges parameter is a list of tuples containing a lower and
@@ -171,11 +497,17 @@ class AdaptiveFloatCoder(FloatCoder):
     def create_random_genome(self):
         "Generates a randomized genome for this encoding"
         init_vals = [random.uniform(r[0], r[1]) for r in self.init_ranges]
-        genome = list(zip(init_vals, self.init_sigmas))
+        genome = np.empty((len(init_vals), 2), order="F")
+        genome[:, 0] = init_vals
+        genome[:, 1] = self.init_sigmas
         return genome
 
     def decode_genome(self, genome):
-        return [g[0] for g in genome]
+        return np.asarray(genome)[:, 0].tolist()
+
+    def decode_population(self, genomes):
+        return np.asarray(genomes)[:, :, 0]
+
 
 
 #############################################################################
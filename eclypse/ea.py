@@ -4,10 +4,18 @@
 ea.py: defines high level EA classes
 """
 
+import os
 import random
 import copy
 
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
 from eclypse.ind import Individual
+from eclypse.ops import evaluate_genome
+from eclypse.checkpoint import save_checkpoint, load_checkpoint
+from eclypse.checkpoint import describe_pipeline
 
 
 #############################################################################
@@ -16,23 +24,200 @@ from eclypse.ind import Individual
 #
 #############################################################################
 class GenerationalEA():
-    def __init__(self, problem, coder, pipeline, pop_size, max_gen):
+    """
+    Runs a generational EA: each generation, the whole population is
+    replaced by pop_size individuals pulled from the pipeline.
+
+    Normally the pipeline contains an Evaluate operator, and individuals are
+    evaluated one at a time as they are pulled.  Alternatively, pass a batch
+    evaluator (any BaseBatchEvaluate, such as BatchEvaluate or
+    ParallelEvaluate, created with a provider of None) and leave evaluation
+    out of the pipeline.  The whole offspring generation is then pulled
+    first and evaluated in a single batch, which gives vectorized and
+    parallel evaluation as much work as possible at once.
+
+    After each generation (including the one the run starts with) every
+    callback is called with the EA as its only argument.  The population,
+    generation number, best of generation (bog) and best so far (bsf) are
+    all available as attributes, and fitnesses() returns the fitness of the
+    whole population as an array.
+
+    The run stops after max_gen generations, or earlier if the termination
+    criterion is met (see eclypse.termination).  The evaluations attribute
+    counts the calls to the fitness function, as reported by the Evaluate
+    operators in the pipeline (or the batch evaluator).
+
+    If checkpoint_file is given, the state of the run is saved to it every
+    checkpoint_every generations (see eclypse.checkpoint), and run(resume=True)
+    will carry on from the last checkpoint.  The state of the termination
+    criterion is saved too, and the callbacks aren't called again for the
+    generation the checkpoint was saved at.  The run continues exactly as it
+    would have, as long as the pipeline and callbacks don't carry state of
+    their own from one generation to the next.
+    """
+    def __init__(self, problem, coder, pipeline, pop_size, max_gen,
+                 evaluator=None, callbacks=(), termination=None,
+                 checkpoint_file=None, checkpoint_every=1, config=None):
+        """
+        @param max_gen: The maximum number of generations.  May be None if
+                        there is a termination criterion.
+        @param evaluator: An optional batch evaluator for evaluating whole
+                          generations.  See above.
+        @param callbacks: Functions to call at the end of each generation.
+        @param termination: An optional stopping criterion.
+        @param checkpoint_file: Where to save checkpoints.  If None, no
+                                checkpoints are saved.
+        @param checkpoint_every: The number of generations between
+                                 checkpoints.
+        @param config: A JSON serializable dictionary saved along with each
+                       checkpoint.
+        """
         self.problem = problem
         self.coder = coder
         self.pipeline = pipeline
         self.pop_size = pop_size
         self.max_gen = max_gen
+        self.evaluator = evaluator
+        self.callbacks = list(callbacks)
+        self.termination = termination
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_every = checkpoint_every
+        self.config = config
+
+        self.population = None
+        self.generation = 0
+        self.evaluations = 0
+        self.bog = None     # Best of generation
+        self.bsf = None     # Best so far
+
+    def initialize(self):
+        """
+        Creates and evaluates the initial population.
+        """
+        self.population = [Individual(self.problem, self.coder)
+                           for _ in range(self.pop_size)]
+        self.evaluate(self.population)
+        self.generation = 0
+
+    def evaluate(self, population):
+        if self.evaluator is not None:
+            self.evaluator.evaluate_population(population)
+        else:
+            for ind in population:
+                if ind.modified:
+                    ind.evaluate()
+                    self.evaluations += 1
+
+    def evaluation_stages(self):
+        """
+        Returns the operators that count evaluations: the batch evaluator,
+        and any in the pipeline.
+        """
+        stages = []
+        if self.evaluator is not None:
+            stages.append(self.evaluator)
+        op = self.pipeline
+        while op is not None:
+            if hasattr(op, "evaluations"):
+                stages.append(op)
+            op = getattr(op, "provider", None)
+        return stages
 
     def step(self, prior_generation):
-        self.pipeline.new_population(prior_generation)
-        new_population = [pipeline.pull() for _ in range(self.pop_size)]
+        self.pipeline.new_generation(prior_generation)
+        new_population = [self.pipeline.pull() for _ in range(self.pop_size)]
+        if self.evaluator is not None:
+            self.evaluator.evaluate_population(new_population)
         return new_population
 
-    def run(self):
-        # Generate initial population
-        population = [Individual(self.problem, self.coder) for _ in range(self.pop_size)]
-        for gen in range(1, max_gen+1):
-            population = self.step(population)
+    def end_generation(self):
+        """
+        Updates the evaluation count and best individuals, and calls the
+        callbacks.
+        """
+        for stage in self.stages:
+            self.evaluations += stage.evaluations - self.stage_counts[stage]
+            self.stage_counts[stage] = stage.evaluations
+
+        self.update_best()
+        for callback in self.callbacks:
+            callback(self)
+
+    def update_best(self):
+        self.bog = self.population[0]
+        for ind in self.population[1:]:
+            if ind.better_than(self.bog):
+                self.bog = ind
+        if self.bsf is None or self.bog.better_than(self.bsf):
+            self.bsf = self.bog
+
+    def fitnesses(self):
+        """
+        Returns the fitnesses of the current population as a numpy array.
+        """
+        return np.array([ind.fitness for ind in self.population])
+
+    def save_checkpoint(self):
+        config = {"pop_size": self.pop_size,
+                  "max_gen": self.max_gen,
+                  "evaluations": self.evaluations,
+                  "pipeline": describe_pipeline(self.pipeline),
+                  "termination": None,
+                  "user": self.config}
+        if self.termination is not None:
+            config["termination"] = self.termination.get_state()
+        save_checkpoint(self.checkpoint_file, self.population,
+                        self.generation, config, best=self.bsf)
+
+    def resume(self):
+        """
+        Restores the population, best so far, generation number, the state
+        of the termination criterion and the random number generators from
+        the checkpoint file.
+        """
+        checkpoint = load_checkpoint(self.checkpoint_file)
+        self.population = checkpoint.individuals(self.problem, self.coder)
+        self.bsf = checkpoint.best(self.problem, self.coder)
+        self.generation = checkpoint.generation
+        self.evaluations = checkpoint.config.get("evaluations", 0)
+        if self.termination is not None and \
+           checkpoint.config.get("termination") is not None:
+            self.termination.set_state(checkpoint.config["termination"])
+        checkpoint.restore_rng()
+        self.update_best()
+
+    def run(self, resume=False):
+        """
+        @param resume: If True and the checkpoint file exists, continue from
+                       the checkpoint instead of starting a new run.
+        @return: The final population.
+        """
+        # Evaluations made by the stages before this run don't count
+        self.stages = self.evaluation_stages()
+        self.stage_counts = {stage: stage.evaluations
+                             for stage in self.stages}
+        self.evaluations = 0
+        if self.termination is not None:
+            self.termination.start(self)
+
+        if resume and self.checkpoint_file is not None and \
+           os.path.exists(self.checkpoint_file):
+            self.resume()   # This generation has already been reported
+        else:
+            self.initialize()
+            self.bsf = None
+            self.end_generation()
+
+        while self.max_gen is None or self.generation < self.max_gen:
+            if self.termination is not None and self.termination.done(self):
+                break
+            self.population = self.step(self.population)
+            self.generation += 1
+            self.end_generation()
+            if self.checkpoint_file is not None and \
+               self.generation % self.checkpoint_every == 0:
+                self.save_checkpoint()
+        return self.population
 
 
 #############################################################################
@@ -41,17 +226,212 @@ class GenerationalEA():
 #
 #############################################################################
 class SteadyStateEA():
-    def __init__(self, problem, coder, pipeline, pop_size):
+    """
+    An asynchronous steady state EA.  Rather than waiting for a whole
+    generation to be evaluated, up to max_in_flight evaluations are kept
+    running on a pool of workers.  As soon as one finishes, the new
+    individual is inserted into the population, and a replacement child is
+    bred from the current population and sent off to be evaluated.  When
+    evaluation times vary a lot (e.g. simulations that can end early), this
+    keeps every worker busy instead of waiting on the slowest individual.
+
+    The pipeline should produce children without evaluating them (no
+    Evaluate operator, and no survival operators).  It is given the
+    population with new_generation() just once, when the initial population
+    is complete, and children are pulled from it from then on.  Insertions
+    replace members of that same list, so selection always sees the current
+    population.
+
+    The initial population is created and evaluated the same way, so the
+    workers are kept busy from the start.  Breeding starts once it is
+    complete.
+
+    The replacement rule decides which member of the population a new
+    individual replaces:
+        "worst"  - the least fit member (the default).
+        "random" - a member chosen at random.
+        A function f(population, ind) that returns the index of the member
+        to replace, or None to discard ind.
+
+    After each insertion, every callback is called with the EA, and the
+    termination criterion (if any) is checked.  For criteria that count
+    generations, a generation is pop_size insertions.  The evaluations
+    attribute counts the evaluations that have finished.
+    """
+    def __init__(self, problem, coder, pipeline, pop_size, max_births,
+                 max_in_flight=None, max_workers=None, executor=None,
+                 replacement="worst", cache=None, callbacks=(),
+                 termination=None):
+        """
+        @param max_births: The run stops after this many individuals
+                           (including the initial population) have been
+                           inserted into the population.  May be None if
+                           there is a termination criterion.
+        @param max_in_flight: The number of evaluations to keep running at
+                              once.  If None, the number of workers.
+        @param max_workers: The number of worker processes, if the EA
+                            creates its own pool.  If None, one per core.
+        @param executor: An existing concurrent.futures executor to use
+                         instead of a new process pool.
+        @param replacement: "worst", "random", or a function.  See above.
+        @param cache: An optional FitnessCache.
+        @param callbacks: Functions to call after each insertion.
+        @param termination: An optional stopping criterion.
+        """
         self.problem = problem
         self.coder = coder
         self.pipeline = pipeline
         self.pop_size = pop_size
+        self.max_births = max_births
+        self.max_workers = max_workers
+        self.executor = executor
+        self.cache = cache
+        self.callbacks = list(callbacks)
+        self.termination = termination
+
+        if max_in_flight is None:
+            max_in_flight = max_workers or os.cpu_count()
+        self.max_in_flight = max_in_flight
+
+        if replacement == "worst":
+            self.replacement = replace_worst
+        elif replacement == "random":
+            self.replacement = replace_random
+        elif callable(replacement):
+            self.replacement = replacement
+        else:
+            raise ValueError("Unknown replacement rule: %r" % (replacement,))
+
+        self.population = []
+        self.births = 0
+        self.evaluations = 0
+        self.pending = {}       # future: individual
+        self.bsf = None         # Best so far
+        self.stopped = False
+
+    @property
+    def generation(self):
+        return self.births // self.pop_size
+
+    def breed(self):
+        """
+        Returns a new individual to evaluate, or None if there shouldn't be
+        one yet.
+        """
+        if self.stopped:
+            return None
+        if self.max_births is not None and \
+           self.births + len(self.pending) >= self.max_births:
+            return None
+        if self.births + len(self.pending) < self.pop_size:
+            return Individual(self.problem, self.coder)
+        if len(self.population) < self.pop_size:
+            return None     # Wait for the initial population
+        return self.pipeline.pull()
+
+    def submit(self):
+        """
+        Breeds and submits individuals until max_in_flight are being
+        evaluated.  Individuals that don't need evaluating (unmodified
+        clones, or those found in the cache) are inserted right away.
+        """
+        while len(self.pending) < self.max_in_flight:
+            ind = self.breed()
+            if ind is None:
+                return
+            if self.cache is not None and ind.modified:
+                fitness = self.cache.get(ind.genetic_coder.genome_key(
+                                             ind.genome))
+                if fitness is not None:
+                    ind.fitness = fitness
+                    ind.modified = False
+            if not ind.modified:
+                self.insert(ind)
+                continue
+            future = self.executor.submit(evaluate_genome, ind.genome,
+                                          ind.genetic_coder, ind.problem)
+            self.pending[future] = ind
+
+    def insert(self, ind):
+        self.births += 1
+        if self.bsf is None or ind.better_than(self.bsf):
+            self.bsf = ind
+
+        if len(self.population) < self.pop_size:
+            self.population.append(ind)
+            if len(self.population) == self.pop_size:
+                self.pipeline.new_generation(self.population)
+        else:
+            index = self.replacement(self.population, ind)
+            if index is not None:
+                self.population[index] = ind
+
+        for callback in self.callbacks:
+            callback(self)
+        if self.termination is not None and \
+           len(self.population) == self.pop_size and \
+           self.termination.done(self):
+            self.stopped = True
 
     def step(self):
-        pass
+        """
+        Waits for at least one evaluation to finish, inserts the results,
+        and submits new children in their place.
+
+        @return: False if there is nothing left to do.
+        """
+        if not self.pending or self.stopped:
+            return False
+        done, not_done = wait(self.pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            ind = self.pending.pop(future)
+            ind.fitness = future.result()
+            ind.modified = False
+            self.evaluations += 1
+            if self.cache is not None:
+                self.cache.put(ind.genetic_coder.genome_key(ind.genome),
+                               ind.fitness)
+            self.insert(ind)
+        self.submit()
+        return True
 
     def run(self):
-        pass
+        """
+        @return: The final population.
+        """
+        own_executor = self.executor is None
+        if own_executor:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.population = []
+        self.births = self.evaluations = 0
+        self.bsf = None
+        self.stopped = False
+        if self.termination is not None:
+            self.termination.start(self)
+        try:
+            self.submit()
+            while self.step():
+                pass
+        finally:
+            for future in self.pending:
+                future.cancel()
+            self.pending = {}
+            if own_executor:
+                self.executor.shutdown()
+                self.executor = None
+        return self.population
+
+
+def replace_worst(population, ind):
+    worst = 0
+    for i in range(1, len(population)):
+        if population[worst].better_than(population[i]):
+            worst = i
+    return worst
+
+
+def replace_random(population, ind):
+    return random.randrange(len(population))
 
 
 #############################################################################
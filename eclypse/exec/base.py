@@ -61,6 +61,15 @@ class ExecutableObject:
         """
         raise NotImplementedError
 
+    def reset(self):
+        """
+        Clears any state left over from previous calls to execute() (such
+        as memory registers), so that the object can be reused as if it had
+        just been created.  Individual.decode() calls this before handing
+        out a cached phenome.  Stateless objects don't need to override it.
+        """
+        pass
+
 
 #############################################################################
 #
@@ -85,13 +94,13 @@ class LearningProblem(BaseProblem):
         return error
 
     def evaluate(self, phenome):
-        return calc_sample_error(phenome, self.training_set)
+        return self.calc_sample_error(phenome, self.training_set)
 
     def test(self, phenome):
-        return calc_sample_error(phenome, self.test_set)
+        return self.calc_sample_error(phenome, self.test_set)
 
     def validate(self, phenome):
-        return calc_sample_error(phenome, self.validation_set)
+        return self.calc_sample_error(phenome, self.validation_set)
 
     def better_than(self, fit1, fit2):
         return fit1 < fit2
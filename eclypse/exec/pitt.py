@@ -12,7 +12,7 @@ import random
 import math
 
 from eclypse.exec.base import ExecutableObject
-from eclypse.coders import BaseCoder
+from eclypse.coders import BaseCoder, copy_list_of_lists
 from eclypse.ops import BaseOp
 
 
@@ -92,7 +92,8 @@ class RuleInterp(ExecutableObject):
         self.ruleset = ruleset
         self.num_inputs = num_inputs
         self.num_outputs = num_outputs
-        self.memRegs = init_mem
+        self.init_mem = list(init_mem)
+        self.memRegs = list(init_mem)
         self.partial_matching = partial_matching
         self.nearest_neighbor = nearest_neighbor
         self.use_alternate_ranks = use_alternate_ranks
@@ -108,6 +109,13 @@ class RuleInterp(ExecutableObject):
 
 
 
+    def reset(self):
+        """
+        Restores the memory registers to their initial values.
+        """
+        self.memRegs = list(self.init_mem)
+
+
     def calc_rule_generality(self, ruleset):
         """
         Calculates how general each rule is.  Rules that cover a larger
@@ -274,6 +282,8 @@ class PittBaseCoder(BaseCoder):
     A base class encoder for Pitt approach style rule sets.
     The create_random_genome() should be defined by sub-classes.
     """
+    genome_layout = "list_of_lists"   # A list of rules
+
     def __init__(self, min_rules, max_rules, num_inputs, num_outputs, \
                  init_mem = [], ruleInterpClass = RuleInterp,
                  partial_matching = False, nearest_neighbor = False,
@@ -341,6 +351,16 @@ class PittBoundsCoder(PittBaseCoder):
         return genome
 
 
+    def copy_genome(self, genome):
+        """
+        Rules with a flat (or array) layout can all be copied in one list
+        comprehension.  Otherwise the rule coder copies each rule.
+        """
+        if self.rule_coder.genome_layout in ("flat", "ndarray"):
+            return copy_list_of_lists(genome)
+        return [self.rule_coder.copy_genome(rule) for rule in genome]
+
+
     def decode_genome(self, genome):
         float_genome = [self.rule_coder.decode_genome(rule) for rule in genome]
         return self.ruleInterpClass(float_genome, self.num_inputs, \
@@ -462,20 +482,29 @@ class PittUniformCrossover(BaseOp):
             if random.random() <= self.p_cross:
                 daughter_genome = []
                 son_genome = []
+                transferred = False
                 for i in range(len(mother.genome)):
                     if random.random() <= self.p_xfer:
                         son_genome.append(mother.genome[i])
+                        transferred = True
                     else:
                         daughter_genome.append(mother.genome[i])
 
                 for i in range(len(father.genome)):
                     if random.random() <= self.p_xfer:
                         daughter_genome.append(father.genome[i])
+                        transferred = True
                     else:
                         son_genome.append(father.genome[i])
 
                 mother.genome = daughter_genome
                 father.genome = son_genome
+                if transferred:
+                    mother.modified = father.modified = True
+                    # Rules are moved, not copied, so a shared rule may now
+                    # be in either child.
+                    if mother.shared_genome or father.shared_genome:
+                        mother.shared_genome = father.shared_genome = True
 
             # XXX Should I randomize the return order?  Ken would say yes.
             if len(mother.genome) > 0:
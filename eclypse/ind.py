@@ -6,6 +6,8 @@ individual.py: defines core classes for Eclypse
 
 import random
 import copy
+import weakref
+from collections import OrderedDict
 
 
 #############################################################################
@@ -30,43 +32,251 @@ def is_iterable(gene_or_genome):
 #
 #############################################################################
 def genome_size(gene_or_genome):
+    """
+    Counts the genes in a genome (or part of one), no matter how deeply they
+    are nested.  None doesn't count as a gene.
+
+    This walks the genome with a stack rather than recursively, and avoids
+    the is_iterable() probe for the common gene and container types.
+    """
     s = 0
-    if is_iterable(gene_or_genome):
-        for gene in gene_or_genome:
-            s += genome_size(gene)
-    elif gene_or_genome is not None:
-        s = 1
+    stack = [gene_or_genome]
+    while stack:
+        g = stack.pop()
+        if type(g) in (int, float, bool):
+            s += 1
+        elif type(g) in (list, tuple):
+            stack.extend(g)
+        elif hasattr(g, "size") and hasattr(g, "ndim"):  # numpy arrays
+            s += g.size
+        elif is_iterable(g):
+            stack.extend(g)
+        elif g is not None:
+            s += 1
 
     return s
 
 
+#############################################################################
+#
+# IndividualContext
+#
+#############################################################################
+class IndividualContext():
+    """
+    Holds the problem and coder for a group of individuals.  Individuals
+    that use the same problem and coder share a single context, so they
+    only need to store one reference to it.
+    """
+    __slots__ = ("problem", "genetic_coder", "__weakref__")
+
+    _contexts = weakref.WeakValueDictionary()
+
+    def __init__(self, problem, genetic_coder):
+        self.problem = problem
+        self.genetic_coder = genetic_coder
+
+    @classmethod
+    def get(cls, problem, genetic_coder):
+        """
+        Returns the shared context for this problem and coder, creating it
+        if needed.  The context holds references to both, so their ids can't
+        be reused while it is in the dictionary.
+        """
+        key = (id(problem), id(genetic_coder))
+        context = cls._contexts.get(key)
+        if context is None:
+            context = cls(problem, genetic_coder)
+            cls._contexts[key] = context
+        return context
+
+
 #############################################################################
 #
 # Individual
 #
 #############################################################################
 class Individual():
+    """
+    The modified attribute is True whenever the genome has changed since the
+    fitness was last calculated.  Operators that change the genome should set
+    it, so that the Evaluate operators know to skip individuals that don't
+    need to be evaluated again (e.g. elites, or clones that made it through
+    crossover and mutation untouched).
+
+    The shared_genome attribute is True when the genome (or parts of it) may
+    be shared with other individuals, as happens with copy on write clones.
+    Operators must not change a shared genome in place.  Instead they should
+    copy just the parts they change (see BaseMutationOp.mutate_genome()).
+
+    The genome size is cached by size(), and the decoded phenome by
+    decode().  Both are cleared whenever modified is set to True, and
+    ignored if the genome has been replaced since.
+
+    Individuals use __slots__ to keep their size down, and keep the problem
+    and coder in a shared IndividualContext.  Subclasses that don't define
+    __slots__ will get a __dict__ as usual.
+    """
+    __slots__ = ("context", "genome", "fitness", "_modified", "shared_genome",
+                 "_size", "_phenome", "__weakref__")
+
+    # The most phenomes that decode() will keep at once, across all
+    # individuals.  The least recently used are dropped first.
+    max_cached_phenomes = 1000
+    _phenome_owners = OrderedDict()
+
     def __init__(self, problem, genetic_coder, genome=None):
-        self.problem = problem
-        self.genetic_coder = genetic_coder
+        self.context = IndividualContext.get(problem, genetic_coder)
         if genome is None:
             self.genome = genetic_coder.create_random_genome()
         else:
             self.genome = genome
         self.fitness = None
+        self._phenome = None
+        self.modified = True
+        self.shared_genome = False
+
+    @property
+    def modified(self):
+        return self._modified
+
+    @modified.setter
+    def modified(self, modified):
+        self._modified = modified
+        if modified:
+            self._size = None
+            if self._phenome is not None:
+                self.forget_phenome()
+
+    @property
+    def problem(self):
+        return self.context.problem
+
+    @problem.setter
+    def problem(self, problem):
+        self.context = IndividualContext.get(problem, self.genetic_coder)
+
+    @property
+    def genetic_coder(self):
+        return self.context.genetic_coder
+
+    @genetic_coder.setter
+    def genetic_coder(self, genetic_coder):
+        self.context = IndividualContext.get(self.problem, genetic_coder)
         
-    def evaluate(self):
-        phenome = self.genetic_coder.decode_genome(self.genome)
+    def evaluate(self, cache=None):
+        """
+        Calculates and returns the fitness.  If a FitnessCache is given, it
+        is checked first, and the new fitness is added to it.
+        """
+        if cache is not None:
+            key = self.genetic_coder.genome_key(self.genome)
+            fitness = cache.get(key)
+            if fitness is not None:
+                self.fitness = fitness
+                self.modified = False
+                return self.fitness
+
+        phenome = self.decode()
         self.fitness = self.problem.evaluate(phenome)
+        self.modified = False
+
+        if cache is not None:
+            cache.put(key, self.fitness)
         return self.fitness
         
-    def clone(self):
-        clone = copy.copy(self)
-        clone.genome = self.genetic_coder.copy_genome(self.genome)
+    def decode(self):
+        """
+        Returns the phenome for this individual's genome.  The phenome is
+        cached, so evaluating, testing and replaying the same individual only
+        decodes it once.  If the phenome has a reset() method (as
+        ExecutableObjects do), it is called before a cached phenome is
+        returned, so state left over from the last use (e.g. memory
+        registers) is cleared.
+
+        The cache is dropped if the individual is modified or given a new
+        genome.  At most max_cached_phenomes are kept across all individuals.
+        """
+        cached = self._phenome
+        if cached is not None and cached[0] is self.genome:
+            phenome = cached[1]
+            ref = Individual._phenome_owners.get(id(self))
+            if ref is not None and ref() is self:
+                Individual._phenome_owners.move_to_end(id(self))
+            else:
+                # Copied or unpickled along with the phenome
+                self.remember_phenome(phenome)
+            reset = getattr(phenome, "reset", None)
+            if reset is not None:
+                reset()
+            return phenome
+
+        phenome = self.genetic_coder.decode_genome(self.genome)
+        if Individual.max_cached_phenomes > 0:
+            self.remember_phenome(phenome)
+        return phenome
+
+    def remember_phenome(self, phenome):
+        owners = Individual._phenome_owners
+        key = id(self)
+        owners.pop(key, None)
+        self._phenome = (self.genome, phenome)
+
+        def forget(ref, key=key):
+            # Only remove the entry if it still belongs to this individual
+            if owners.get(key) is ref:
+                del owners[key]
+        owners[key] = weakref.ref(self, forget)
+
+        while len(owners) > Individual.max_cached_phenomes:
+            key, ref = owners.popitem(last=False)
+            ind = ref()
+            if ind is not None:
+                ind._phenome = None
+
+    def forget_phenome(self):
+        self._phenome = None
+        owners = Individual._phenome_owners
+        ref = owners.get(id(self))
+        if ref is not None and ref() is self:
+            del owners[id(self)]
+
+    def clone(self, copy_on_write=False):
+        """
+        Returns a copy of this individual.  If copy_on_write is True, the
+        genome is not copied.  The clone shares it with this individual, and
+        the operators copy only the parts they change.
+        """
+        if type(self) is Individual:
+            # Much quicker than copy.copy() with __slots__
+            clone = Individual.__new__(Individual)
+            clone.context = self.context
+            clone.genome = self.genome
+            clone.fitness = self.fitness
+            clone._modified = self._modified
+            clone._size = self._size
+        else:
+            clone = copy.copy(self)
+        clone._phenome = None     # Phenomes may have state, so don't share
+
+        if copy_on_write:
+            self.shared_genome = clone.shared_genome = True
+        else:
+            clone.genome = self.genetic_coder.copy_genome(self.genome)
+            clone.shared_genome = False
+            if clone._size is not None:     # The copy is the same size
+                clone._size = (clone.genome, clone._size[1])
         return clone
     
     def size(self):
-        return genome_size(self.genome)
+        # The genome is stored with the size, as in decode(), so a new
+        # genome isn't given the old one's size.
+        cached = self._size
+        if cached is not None and cached[0] is self.genome:
+            return cached[1]
+        size = self.genetic_coder.count_genes(self.genome)
+        self._size = (self.genome, size)
+        return size
 
     def better_than(self, other_ind):
         return self.problem.better_than(self.fitness, other_ind.fitness)
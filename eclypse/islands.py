@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+
+"""
+islands.py: defines a multi-process island model for Eclypse
+"""
+
+import time
+import queue
+import heapq
+import random
+import functools
+import multiprocessing
+
+import numpy as np
+
+from eclypse.ind import Individual
+from eclypse.ea import GenerationalEA
+from eclypse.select import select_cmp_default
+
+
+#############################################################################
+#
+# Topologies
+#
+# A topology is a function that returns the islands that a given island
+# sends its migrants to.  Each island calls it independently, so the result
+# must only depend on the arguments.  Migrations are numbered by epoch.
+# An island never sends migrants to itself, so with a single island there
+# are no destinations.
+#
+#############################################################################
+def ring_topology(island, num_islands, epoch, seed):
+    if num_islands < 2:
+        return []
+    return [(island + 1) % num_islands]
+
+
+def full_topology(island, num_islands, epoch, seed):
+    return [i for i in range(num_islands) if i != island]
+
+
+def random_topology(island, num_islands, epoch, seed):
+    """
+    Every island sends to one other island, chosen at random.  The choice
+    changes from one epoch to the next, but every island computes the same
+    one, since the generator is seeded with the seed and the epoch.
+    """
+    if num_islands < 2:
+        return []
+    rng = random.Random("%s:%d" % (seed, epoch))
+    destinations = []
+    for i in range(num_islands):
+        destination = rng.randrange(num_islands - 1)
+        destinations.append(destination + (destination >= i))
+    return [destinations[island]]
+
+
+TOPOLOGIES = {"ring": ring_topology,
+              "full": full_topology,
+              "random": random_topology}
+
+
+#############################################################################
+#
+# IslandModel
+#
+#############################################################################
+class IslandModel():
+    """
+    Runs several GenerationalEAs (islands) at once, each in its own process
+    with its own copy of the pipeline, so the run speeds up with the number
+    of cores.  Every migration_interval generations, each island sends
+    copies of its best num_migrants individuals to the islands the topology
+    chooses, where they replace the worst.  Only genomes and fitnesses are
+    sent.
+
+    Migration is asynchronous: islands never wait for each other.  Migrants
+    are collected whenever the receiving island next migrates, so islands
+    that run at different speeds don't hold each other up.  Only at the end
+    of its run does an island wait for the migrants still on their way to
+    it, so that none are lost.
+
+    The problem, coder and pipeline must be picklable (and the pipeline must
+    not have been started yet), since they are sent to the island processes.
+
+    run() returns a list of statistics for each island (see IslandStats).
+    """
+    def __init__(self, problem, coder, pipeline, num_islands, pop_size,
+                 max_gen, migration_interval=10, num_migrants=1,
+                 topology="ring", seed=None, evaluator=None):
+        """
+        @param pipeline: The pipeline each island uses.  Each island
+                         gets its own copy.
+        @param num_islands: The number of islands, and processes.
+        @param pop_size: The population size of each island.
+        @param migration_interval: The number of generations between
+                                   migrations.
+        @param num_migrants: The number of individuals each island sends.
+        @param topology: "ring", "full", "random", or a topology function.
+        @param seed: Used to seed each island's random number generators
+                     (along with the island number) and the random
+                     topology.  If None, islands are seeded from the OS.
+        @param evaluator: An optional batch evaluator for each island.  See
+                          GenerationalEA.
+        """
+        self.problem = problem
+        self.coder = coder
+        self.pipeline = pipeline
+        self.num_islands = num_islands
+        self.pop_size = pop_size
+        self.max_gen = max_gen
+        self.migration_interval = migration_interval
+        self.num_migrants = num_migrants
+        self.topology = TOPOLOGIES.get(topology, topology)
+        self.seed = seed
+        self.evaluator = evaluator
+
+        self.stats = None
+        self.best = None
+
+    def run(self):
+        """
+        Runs all the islands to completion.  If an island raises an
+        exception, it is raised here, and if an island process dies a
+        RuntimeError is raised.  Either way the other islands are stopped.
+
+        @return: A list of IslandStats, one per island.
+        """
+        inboxes = [multiprocessing.Queue() for _ in range(self.num_islands)]
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_island,
+                                             args=(self, island, inboxes,
+                                                   results))
+                     for island in range(self.num_islands)]
+        for process in processes:
+            process.start()
+
+        # Read the results before joining, or the processes may not exit.
+        # Check now and then for islands that died without reporting.
+        stats = [None] * self.num_islands
+        reported = 0
+        while reported < self.num_islands:
+            try:
+                island_stats = results.get(timeout=1.0)
+            except queue.Empty:
+                for island, process in enumerate(processes):
+                    if stats[island] is None and \
+                       process.exitcode not in (None, 0):
+                        terminate(processes)
+                        raise RuntimeError("Island %d died with exit code %d"
+                                           % (island, process.exitcode))
+                continue
+            if isinstance(island_stats, BaseException):
+                terminate(processes)
+                raise island_stats
+            stats[island_stats.island] = island_stats
+            reported += 1
+        for process in processes:
+            process.join()
+        for inbox in inboxes:
+            inbox.close()
+
+        self.stats = stats
+        best = stats[0]
+        for island_stats in stats[1:]:
+            if self.problem.better_than(island_stats.best_fitness,
+                                        best.best_fitness):
+                best = island_stats
+        self.best = Individual(self.problem, self.coder, best.best_genome)
+        self.best.fitness = best.best_fitness
+        self.best.modified = False
+        return stats
+
+    def report(self):
+        """
+        Returns a table of the statistics for each island as a string.
+        """
+        lines = ["island  generations  gen/sec  best        mean"
+                 "        sent  received"]
+        for s in self.stats:
+            lines.append("%6d  %11d  %7.1f  %-10.6g  %-10.6g  %4d  %8d" %
+                         (s.island, s.generations,
+                          s.generations / max(s.elapsed, 1e-9),
+                          s.best_fitness, s.mean_fitness[-1],
+                          s.migrants_sent, s.migrants_received))
+        return "\n".join(lines)
+
+
+def terminate(processes):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+
+
+#############################################################################
+#
+# IslandStats
+#
+#############################################################################
+class IslandStats():
+    """
+    What an island reports when it is finished.  The history lists have one
+    entry per generation, starting with the initial population.
+    """
+    def __init__(self, island):
+        self.island = island
+        self.generations = 0
+        self.elapsed = 0.0
+        self.best_fitness = None
+        self.best_genome = None
+        self.best_history = []
+        self.mean_fitness = []
+        self.migrants_sent = 0
+        self.migrants_received = 0
+
+
+#############################################################################
+#
+# Island processes
+#
+#############################################################################
+def run_island(model, island, inboxes, results):
+    """
+    The main function of an island process.
+    """
+    try:
+        # Forked processes all start with the same generator states
+        if model.seed is None:
+            random.seed()
+            np.random.seed()
+        else:
+            random.seed(model.seed * model.num_islands + island)
+            np.random.seed(model.seed * model.num_islands + island)
+
+        stats = IslandStats(island)
+        migrate = Migration(model, island, inboxes, stats)
+        ea = GenerationalEA(model.problem, model.coder, model.pipeline,
+                            model.pop_size, model.max_gen,
+                            evaluator=model.evaluator,
+                            callbacks=[migrate])
+        start = time.time()
+        ea.run()
+        migrate.receive_remaining(ea)
+
+        stats.elapsed = time.time() - start
+        stats.generations = ea.generation
+        stats.best_fitness = ea.bsf.fitness
+        stats.best_genome = ea.bsf.genome
+        results.put(stats)
+    except BaseException as e:
+        results.put(e)
+
+
+fitness_key = functools.cmp_to_key(select_cmp_default)
+
+
+class Migration():
+    """
+    A GenerationalEA callback that exchanges migrants every
+    migration_interval generations and records the island's statistics.
+    """
+    def __init__(self, model, island, inboxes, stats):
+        self.model = model
+        self.island = island
+        self.inboxes = inboxes
+        self.stats = stats
+        self.messages_received = 0
+
+    def __call__(self, ea):
+        model = self.model
+        if ea.generation > 0 and ea.generation % model.migration_interval == 0:
+            self.migrate(ea)
+
+        fitnesses = ea.fitnesses()
+        self.stats.best_history.append(ea.bog.fitness)
+        self.stats.mean_fitness.append(float(np.mean(fitnesses)))
+
+    def migrate(self, ea):
+        # Immigrants first, so the emigrants can include the best of them
+        inbox = self.inboxes[self.island]
+        while True:
+            try:
+                self.receive(ea, inbox.get_nowait())
+            except queue.Empty:
+                break
+
+        model = self.model
+        epoch = ea.generation // model.migration_interval
+        destinations = model.topology(self.island, model.num_islands, epoch,
+                                      model.seed)
+        best = heapq.nlargest(model.num_migrants, ea.population,
+                              key=fitness_key)
+        migrants = [(ind.genome, ind.fitness) for ind in best]
+        for destination in destinations:
+            self.inboxes[destination].put(migrants)
+            self.stats.migrants_sent += len(migrants)
+
+    def receive(self, ea, immigrants):
+        """
+        Replaces the worst members of the population with immigrants, and
+        updates the EA's best of generation and best so far to match.
+        """
+        model = self.model
+        population = ea.population
+        ranked = sorted(range(len(population)),    # Worst first
+                        key=lambda i: fitness_key(population[i]))
+        for i, (genome, fitness) in zip(ranked, immigrants):
+            ind = Individual(model.problem, model.coder, genome)
+            ind.fitness = fitness
+            ind.modified = False
+            population[i] = ind
+        self.messages_received += 1
+        self.stats.migrants_received += min(len(immigrants), len(population))
+
+        ea.bog = max(population, key=fitness_key)
+        if ea.bog.better_than(ea.bsf):
+            ea.bsf = ea.bog
+
+    def expected_messages(self):
+        """
+        Returns the number of times other islands send migrants to this one
+        during the run.
+        """
+        model = self.model
+        count = 0
+        for epoch in range(1, model.max_gen // model.migration_interval + 1):
+            for sender in range(model.num_islands):
+                count += model.topology(sender, model.num_islands, epoch,
+                                        model.seed).count(self.island)
+        return count
+
+    def receive_remaining(self, ea):
+        """
+        Waits for the migrants that haven't arrived yet.  Every island sends
+        all of its migrants before it starts waiting, so this always ends.
+        """
+        inbox = self.inboxes[self.island]
+        expected = self.expected_messages()
+        while self.messages_received < expected:
+            self.receive(ea, inbox.get())
+
+
+#############################################################################
+#
+# unit_test
+#
+#############################################################################
+if __name__ == "__main__":
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, Evaluate
+    from eclypse.survive import Elitism
+
+    problem = SimilarityProblem([1] * 20)  # Max Ones
+    coder = BinaryCoder(20)
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = Clone(pipeline)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.05)
+    pipeline = Evaluate(pipeline)
+    pipeline = Elitism(pipeline, num_elite=1)
+
+    model = IslandModel(problem, coder, pipeline, num_islands=4, pop_size=20,
+                        max_gen=20, migration_interval=5, seed=1)
+    model.run()
+    print(model.report())
+    assert(len(model.stats) == 4)
+    assert(all(s.migrants_received == s.migrants_sent for s in model.stats))
+    print("passed")
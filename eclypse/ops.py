@@ -7,9 +7,65 @@ ops.py: Define the basic operators for a pipeline system.
 import random
 import copy
 import math
+import asyncio
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
-from eclypse.ind import Individual, is_iterable
+from eclypse.ind import Individual, is_iterable, genome_size
+from eclypse.population import SharedPopulation, shared_executor
+
+
+#############################################################################
+#
+# same_genes
+#
+#############################################################################
+def same_genes(gene_or_genome1, gene_or_genome2):
+    """
+    A helper function.  Returns True if the two genes (or genomes) contain
+    the same values.
+    """
+    if isinstance(gene_or_genome1, np.ndarray) or \
+       isinstance(gene_or_genome2, np.ndarray):
+        return np.array_equal(gene_or_genome1, gene_or_genome2)
+    return gene_or_genome1 == gene_or_genome2
+
+
+#############################################################################
+#
+# sample_mutation_sites
+#
+#############################################################################
+def sample_mutation_sites(num_genes, p_mut):
+    """
+    Returns a sorted list of gene positions, where each position in
+    range(num_genes) is included independently with probability p_mut.
+
+    Rather than drawing a random number for every gene, the gap between
+    one chosen position and the next is drawn from a geometric distribution.
+    This takes one random draw per chosen position, which makes a big
+    difference for long genomes with low mutation rates.
+    """
+    if p_mut <= 0.0 or num_genes <= 0:
+        return []
+    if p_mut >= 1.0:
+        return list(range(num_genes))
+
+    # log1p() keeps tiny probabilities from rounding to log(1.0) == 0.0
+    log_q = math.log1p(-p_mut)
+    if log_q == 0.0:
+        return []
+    sites = []
+    i = -1
+    while 1:
+        # Number of failures before the next success.  1-random() is in
+        # (0, 1], which keeps log() happy.  The gap is checked before it is
+        # converted, since it may be too big (or infinite) for int().
+        gap = math.log(1.0 - random.random()) / log_q
+        if i + 1 + gap >= num_genes:
+            return sites
+        i += 1 + int(gap)
+        sites.append(i)
 
 
 #############################################################################
@@ -43,11 +99,22 @@ class BaseOp():
 #
 #############################################################################
 class Clone(BaseOp):
-    """ Clones an individual.  Making this explicit saved confusion and time."""
+    """
+    Clones an individual.  Making this explicit saved confusion and time.
+
+    If copy_on_write is True, clones share their parent's genome, and the
+    operators that follow copy only the parts of it that they change.  This
+    saves a lot of copying with large genomes that are only slightly
+    changed, such as Pitt rule sets.
+    """
+    def __init__(self, provider, copy_on_write=False):
+        super().__init__(provider=provider)
+        self.copy_on_write = copy_on_write
+
     def generator(self):
         while 1:
             ind = self.provider.pull()
-            new_ind = ind.clone()
+            new_ind = ind.clone(self.copy_on_write)
             yield new_ind
 
 
@@ -61,15 +128,345 @@ class Evaluate(BaseOp):
     Calculates the fitness of an individual as it comes through the pipeline.
     Some evaluations are expensive, so it pays to make this explicit to avoid
     unnecessary duplication.
+
+    Individuals whose genomes have not been modified since they were last
+    evaluated are passed through untouched.  A FitnessCache can also be
+    provided to avoid re-evaluating genomes that have been seen before.
+
+    The evaluations attribute counts the number of times the fitness
+    function has actually been called (cache hits don't count).
     """
+    def __init__(self, provider, cache=None):
+        super().__init__(provider=provider)
+        self.cache = cache
+        self.evaluations = 0
+
     def generator(self):
         while 1:
             ind = self.provider.pull()
             #print("Genome:", ind)
-            ind.evaluate()
+            if ind.modified:
+                if self.cache is None:
+                    ind.evaluate()
+                    self.evaluations += 1
+                else:
+                    misses = self.cache.misses
+                    ind.evaluate(self.cache)
+                    self.evaluations += self.cache.misses - misses
             yield ind
 
 
+#############################################################################
+#
+# evaluate_genome
+#
+#############################################################################
+def evaluate_genome(genome, genetic_coder, problem):
+    """
+    Decodes and evaluates a single genome, returning the fitness.  This is a
+    module level function so that it can be sent to worker processes.
+    """
+    phenome = genetic_coder.decode_genome(genome)
+    return problem.evaluate(phenome)
+
+
+#############################################################################
+#
+# BaseBatchEvaluate
+#
+#############################################################################
+class BaseBatchEvaluate(BaseOp):
+    """
+    A base class for evaluation operators that work on several individuals at
+    once.  Individuals are pulled from the provider in batches, evaluated
+    with evaluate_batch(), and then yielded in the same order they were
+    pulled.  Subclasses just need to implement evaluate_batch().
+
+    Only individuals whose genomes have been modified since they were last
+    evaluated are passed on to evaluate_batch().  If a FitnessCache is
+    provided, individuals that hit in the cache are also left out.  The
+    evaluations attribute counts the individuals passed to evaluate_batch().
+
+    In a pipeline, batch_size must be given, and should be the number of
+    individuals actually pulled through this operator each generation (or a
+    divisor of it).  Any individuals left over in the last batch are
+    evaluated and then thrown away when the next generation starts.  Note
+    that this isn't always the population size.  With Elitism(num_elite)
+    after this operator, for example, only pop_size - num_elite are pulled
+    through it.  Since the operator can't know that, there is no default.
+
+    batch_size isn't needed when evaluate_population() is called directly,
+    as GenerationalEA does with a batch evaluator.
+    """
+    def __init__(self, provider, batch_size=None, cache=None):
+        """
+        @param provider: The operator that immediately precedes this one in
+                         the pipeline.
+        @param batch_size: The number of individuals to pull and evaluate at
+                           once.  Required in a pipeline.  See above.
+        @param cache: An optional FitnessCache.
+        """
+        super().__init__(provider=provider)
+        self.batch_size = batch_size
+        self.cache = cache
+        self.evaluations = 0
+
+    def evaluate_batch(self, batch):
+        """
+        Sets the fitness of every individual in the list batch.
+        """
+        raise NotImplementedError
+
+    def generator(self):
+        batch_size = self.batch_size
+        if batch_size is None:
+            raise ValueError("%s needs a batch_size to be used in a pipeline"
+                             % type(self).__name__)
+
+        while 1:
+            batch = [self.provider.pull() for _ in range(batch_size)]
+            self.evaluate_population(batch)
+            for ind in batch:
+                yield ind
+
+    def evaluate_population(self, population):
+        """
+        Evaluates the modified individuals in population (checking the cache
+        first, if there is one).  This can also be called directly, without
+        a provider, in order to evaluate a whole generation at once (see
+        GenerationalEA).
+        """
+        modified = [ind for ind in population if ind.modified]
+        if self.cache is None:
+            self.evaluate_batch(modified)
+            self.evaluations += len(modified)
+        else:
+            self.evaluations += self.evaluate_uncached(modified)
+        for ind in modified:
+            ind.modified = False
+
+    def evaluate_uncached(self, batch):
+        """
+        Evaluates the individuals in batch that aren't in the cache.
+
+        @return: The number of individuals evaluated.
+        """
+        keys = [ind.genetic_coder.genome_key(ind.genome) for ind in batch]
+        misses = []
+        for ind, key in zip(batch, keys):
+            ind.fitness = self.cache.get(key)
+            if ind.fitness is None:
+                misses.append((ind, key))
+
+        self.evaluate_batch([ind for ind, key in misses])
+        for ind, key in misses:
+            self.cache.put(key, ind.fitness)
+        return len(misses)
+
+
+#############################################################################
+#
+# BatchEvaluate
+#
+#############################################################################
+class BatchEvaluate(BaseBatchEvaluate):
+    """
+    Decodes a batch of individuals (e.g. a whole generation) and hands all
+    the phenomes to the problem's evaluate_batch() method in a single
+    call.  This works best with problems that can evaluate many phenomes at
+    once, such as a FuncOptProblem with a vectorized function.
+    """
+    def evaluate_batch(self, batch):
+        if not batch:
+            return
+        problem = batch[0].problem
+        coder = batch[0].genetic_coder
+        phenomes = coder.decode_population([ind.genome for ind in batch])
+        fitnesses = problem.evaluate_batch(phenomes)
+        for ind, fitness in zip(batch, fitnesses):
+            ind.fitness = fitness
+
+
+#############################################################################
+#
+# ParallelEvaluate
+#
+#############################################################################
+class ParallelEvaluate(BaseBatchEvaluate):
+    """
+    A replacement for Evaluate that farms the evaluations out to a pool of
+    worker processes.  Individuals are pulled from the provider in batches
+    of batch_size, and then yielded in the same order they were pulled once
+    the whole batch has been evaluated.
+
+    The pool is created the first time it is needed and is then reused from
+    one generation to the next.  Call shutdown() when the run is over.
+
+    Note that the problem and coder must be picklable, since they are sent to
+    the workers along with each genome.
+
+    With shared_memory=True, the problem and coder are sent to each worker
+    just once, when the pool starts.  The genomes of each batch are copied
+    into a SharedPopulation, and each task is just a range of its rows, so
+    the cost of a task doesn't grow with the genome size.  This requires
+    fixed length genomes that fit in a numpy array, and numeric fitnesses.
+    """
+    def __init__(self, provider, batch_size=None, max_workers=None,
+                 executor=None, cache=None, shared_memory=False):
+        """
+        @param provider: The operator that immediately precedes this one in
+                         the pipeline.
+        @param batch_size: The number of individuals to pull and evaluate at
+                           once.  Required in a pipeline.  See
+                           BaseBatchEvaluate.
+        @param max_workers: The number of worker processes.  If None, the
+                            ProcessPoolExecutor default is used (one per
+                            core).
+        @param executor: An existing concurrent.futures executor to use
+                         instead of creating a new process pool.  When
+                         shared_memory is True, it must have been created
+                         by eclypse.population.shared_executor().
+        @param cache: An optional FitnessCache.
+        @param shared_memory: If True, pass genomes and fitnesses to the
+                              workers through shared memory.
+        """
+        super().__init__(provider=provider, batch_size=batch_size,
+                         cache=cache)
+        self.max_workers = max_workers
+        self.executor = executor
+        self.shared_memory = shared_memory
+        self.shared_population = None
+
+    def get_executor(self, problem, genetic_coder):
+        if self.executor is None:
+            if self.shared_memory:
+                self.executor = shared_executor(problem, genetic_coder,
+                                                self.max_workers)
+            else:
+                self.executor = ProcessPoolExecutor(
+                                    max_workers=self.max_workers)
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.shared_population is not None:
+            self.shared_population.release()
+            self.shared_population = None
+
+    def evaluate_batch(self, batch):
+        if not batch:
+            return
+        executor = self.get_executor(batch[0].problem, batch[0].genetic_coder)
+        if self.shared_memory:
+            self.evaluate_shared(executor, batch)
+            return
+
+        futures = [executor.submit(evaluate_genome, ind.genome,
+                                   ind.genetic_coder, ind.problem)
+                   for ind in batch]
+        for ind, future in zip(batch, futures):
+            ind.fitness = future.result()
+
+    def evaluate_shared(self, executor, batch):
+        problem = batch[0].problem
+        coder = batch[0].genetic_coder
+        genomes = np.asarray([ind.genome for ind in batch],
+                             dtype=coder.genome_dtype)
+
+        # Reuse the shared segments from one batch to the next if possible,
+        # so the workers don't have to attach to new ones.
+        population = self.shared_population
+        if population is None or len(population) < len(batch) or \
+           population.genomes.shape[1:] != genomes.shape[1:] or \
+           population.genomes.dtype != genomes.dtype:
+            if population is not None:
+                population.release()
+            population = SharedPopulation(problem, coder, genomes)
+            self.shared_population = population
+        else:
+            population.genomes[:len(batch)] = genomes
+
+        population.modified[:len(batch)] = True
+        population.modified[len(batch):] = False
+        population.fitness_type = int
+        population.evaluate_parallel(executor, num_rows=len(batch))
+        for ind, fitness in zip(batch, population.fitness.tolist()):
+            ind.fitness = population.fitness_type(fitness)
+
+
+#############################################################################
+#
+# AsyncEvaluate
+#
+#############################################################################
+class AsyncEvaluate(BaseBatchEvaluate):
+    """
+    Evaluates individuals using the problem's evaluate_async() coroutine,
+    keeping up to max_in_flight evaluations running at the same time on an
+    event loop.  This is meant for fitness functions that spend most of
+    their time waiting on something else (e.g. a simulator on a socket or in
+    a subprocess), where a process per evaluation would be wasteful.
+
+    The event loop is owned by this operator and is reused from one
+    generation to the next, so problems can hold on to connections between
+    calls.  Call shutdown() when the run is over.
+
+    Since evaluation blocks until the batch is done, this operator must be
+    used from synchronous code.  It can't run inside another event loop
+    (e.g. in a Jupyter notebook or an async application), and raises a
+    RuntimeError if it is asked to; run the EA in a separate thread instead.
+    """
+    def __init__(self, provider, max_in_flight=10, batch_size=None,
+                 cache=None):
+        """
+        @param provider: The operator that immediately precedes this one in
+                         the pipeline.
+        @param max_in_flight: The maximum number of evaluations that can be
+                              awaiting results at any one time.
+        @param batch_size: The number of individuals to pull and evaluate at
+                           once.  Required in a pipeline.  See
+                           BaseBatchEvaluate.
+        @param cache: An optional FitnessCache.
+        """
+        super().__init__(provider=provider, batch_size=batch_size,
+                         cache=cache)
+        self.max_in_flight = max_in_flight
+        self.loop = None
+
+    def get_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop
+
+    def shutdown(self):
+        if self.loop is not None:
+            self.loop.close()
+            self.loop = None
+
+    async def evaluate_async(self, ind, semaphore):
+        async with semaphore:
+            phenome = ind.decode()
+            ind.fitness = await ind.problem.evaluate_async(phenome)
+
+    async def gather_batch(self, batch):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        await asyncio.gather(*[self.evaluate_async(ind, semaphore)
+                               for ind in batch])
+
+    def evaluate_batch(self, batch):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:    # No loop running, as there should be
+            pass
+        else:
+            raise RuntimeError("AsyncEvaluate can't be used while an event "
+                               "loop is running in this thread.  Run the "
+                               "EA in a separate thread instead.")
+        self.get_loop().run_until_complete(self.gather_batch(batch))
+
+
 #############################################################################
 #
 # BaseMutationOp
@@ -87,6 +484,7 @@ class BaseMutationOp(BaseOp):
         self.p_mut = p_mut
         self.e_mut = e_mut
         self.recurse = recurse
+        self.copy_on_write = False
 
     def generator(self):
         while 1:
@@ -95,39 +493,68 @@ class BaseMutationOp(BaseOp):
             # Figure out the mutation probability p_mut
             p_mut = self.p_mut
             if p_mut is None:
-                size = self.genome_size(ind.genome, self.recurse)
+                if self.recurse:
+                    size = ind.size()   # cached
+                else:
+                    size = self.genome_size(ind.genome, recurse=False)
                 p_mut = float(self.e_mut) / size
 
             # Mutate the individual
+            self.genome_changed = False
+            self.copy_on_write = ind.shared_genome
             ind.genome = self.mutate_genome(ind.genome, p_mut)
+            if self.genome_changed:
+                ind.modified = True
 
             yield ind
 
 
-    # XXX Should this be a general utility function?
     def genome_size(self, genome, recurse=True):
+        """
+        Counts the genes that mutate_genome() would consider.  When recurse
+        is False, genes nested inside the top level are not counted.
+        """
+        if recurse:
+            return genome_size(genome)
+
         size = 0
         for g in genome:
-            if is_iterable(g):
-                if recurse:
-                    size += genome_size(g)
-            else:
+            if not is_iterable(g):
                 size += 1
+        return size
 
 
     def mutate_genome(self, genome, p_mut):
         """
-        Traverses the genome, calling mutate_gene() when appropriate
+        Traverses the genome, calling mutate_gene() when appropriate.
+        Sets self.genome_changed if any gene was given a new value.
+
+        If self.copy_on_write is set, the genome may be shared with other
+        individuals, so it is not changed in place.  Instead, each sequence
+        in the genome that needs changing is copied first, and the copy of
+        the genome is returned.  Unchanged parts remain shared.
         """
+        new_genome = genome
         for i,g in enumerate(genome):
             if is_iterable(g):
-                if self.recurse:
-                    genome[i] = self.mutate_genome(g, p_mut)
+                if not self.recurse:
+                    continue
+                new_gene = self.mutate_genome(g, p_mut)
+                if new_gene is g:
+                    continue
+            elif random.random() <= p_mut:
+                new_gene = self.mutate_gene(g)
+                if new_gene == g:
+                    continue
+                self.genome_changed = True
             else:
-                if random.random() <= p_mut:
-                    genome[i] = self.mutate_gene(g)
+                continue
 
-        return genome
+            if new_genome is genome and self.copy_on_write:
+                new_genome = copy.copy(genome)
+            new_genome[i] = new_gene
+
+        return new_genome
 
 
     def mutate_gene(self, gene):
@@ -141,9 +568,96 @@ class BaseMutationOp(BaseOp):
 #
 #############################################################################
 class BitFlipMutation(BaseMutationOp):
+    """
+    Flips bits with probability p_mut.
+
+    Flat genomes (lists or numpy arrays of any shape, including a whole
+    Population's genome matrix) take a fast path.  Instead of drawing a
+    random number for every bit, sample_mutation_sites() jumps directly from
+    one flipped bit to the next.  The distribution of mutations is the same
+    either way.  Nested genomes are traversed as usual.
+    """
     def mutate_gene(self, gene):
         return int(not gene)
 
+    def mutate_genome(self, genome, p_mut):
+        if isinstance(genome, np.ndarray):
+            sites = sample_mutation_sites(genome.size, p_mut)
+            if sites:
+                if self.copy_on_write:
+                    genome = genome.copy()
+                index = np.unravel_index(sites, genome.shape)
+                genome[index] = np.logical_not(genome[index])
+                self.genome_changed = True
+            return genome
+
+        if len(genome) > 0 and is_iterable(genome[0]):
+            return super().mutate_genome(genome, p_mut)
+
+        sites = sample_mutation_sites(len(genome), p_mut)
+        if sites and self.copy_on_write:
+            genome = genome[:]
+        for i in sites:
+            genome[i] = self.mutate_gene(genome[i])
+            self.genome_changed = True
+        return genome
+
+    def mutate_population(self, genomes):
+        """
+        Mutates a 2-D array of genomes (e.g. Population.genomes) in place.
+        """
+        self.copy_on_write = False    # May be left over from the pipeline
+        p_mut = self.p_mut
+        if p_mut is None:
+            p_mut = float(self.e_mut) / genomes.shape[1]
+        return self.mutate_genome(genomes, p_mut)
+
+
+
+#############################################################################
+#
+# PackedBitFlipMutation
+#
+#############################################################################
+class PackedBitFlipMutation(BaseOp):
+    """
+    Bit flip mutation for genomes from the PackedBinaryCoder.  The bits to
+    flip are chosen with sample_mutation_sites(), and are flipped by XORing
+    the words that contain them.
+    """
+    def __init__(self, provider, p_mut=None, e_mut=None):
+        super().__init__(provider=provider)
+        assert((p_mut is None) != (e_mut is None)) # One and only one is defined
+        self.p_mut = p_mut
+        self.e_mut = e_mut
+
+    def mutate_genome(self, genome, num_bits, p_mut):
+        """
+        Flips bits in the packed genome in place.  Returns the number of bits
+        that were flipped.
+        """
+        sites = np.array(sample_mutation_sites(num_bits, p_mut), dtype=np.intp)
+        bit_masks = (0x80 >> (sites & 7)).astype(np.uint8)
+        np.bitwise_xor.at(genome, sites >> 3, bit_masks)
+        return len(sites)
+
+    def generator(self):
+        while 1:
+            ind = self.provider.pull()
+            num_bits = ind.genetic_coder.genome_size
+
+            p_mut = self.p_mut
+            if p_mut is None:
+                p_mut = float(self.e_mut) / num_bits
+
+            genome = ind.genome
+            if ind.shared_genome:
+                genome = genome.copy()
+            if self.mutate_genome(genome, num_bits, p_mut) > 0:
+                ind.genome = genome
+                ind.modified = True
+
+            yield ind
 
 
 #############################################################################
@@ -176,6 +690,10 @@ class AdaptiveMutation(BaseOp):
     the standard deviation (sigma) associated with the gene.  The standard
     deviations are are adapted from one generation to the next.
 
+    All the genes are mutated at once using numpy (and numpy's random number
+    generator).  mutate_population() does the same for a whole population's
+    genome array.
+
     NOTE: This operator should be used with the AdaptiveFloatCoder.
     """
     def __init__(self, provider, sigma_bounds):
@@ -190,61 +708,44 @@ class AdaptiveMutation(BaseOp):
         self.sigma_bounds = sigma_bounds
         self.tau = 1.0/math.sqrt(2 * math.sqrt(len(sigma_bounds)))
         self.tau_prime = 1.0/math.sqrt(2 * len(sigma_bounds))
+        self.sigma_mins = np.array([b[0] for b in sigma_bounds], dtype=float)
+        self.sigma_maxs = np.array([b[1] for b in sigma_bounds], dtype=float)
 
-        #if init_sigmas is not None:
-        #    self.init_sigmas = init_sigmas
-        #elif gene_init_bounds is not None:   # Default calc for init_sigmas
-        #    denom = math.sqrt(len(gene_init_bounds))
-        #    self.init_sigmas = [(b[1]-b[0]) / denom for b in gene_init_bounds]
-        #else:
-        #    raise ValueError("init_sigmas or gene_init_bounds must be provided")
-        #
-        #self.num_sigma_sets = 0
+    def mutate_genome(self, genome):
+        """
+        Returns a mutated copy of the genome.  The genome can be an array
+        of shape (num_genes, 2), or (N, num_genes, 2) for N genomes at once.
+        Lists of (value, sigma) tuples are also accepted.
+        """
+        genome = np.asarray(genome, dtype=float)
+        values = genome[..., 0]
+        sigmas = genome[..., 1]
+
+        # The tau_prime term is shared by all the genes of one genome.
+        tau_prime_term = self.tau_prime * \
+                         np.random.standard_normal(sigmas.shape[:-1] + (1,))
+        sigmas = sigmas * np.exp(tau_prime_term + self.tau *
+                                 np.random.standard_normal(sigmas.shape))
+        np.clip(sigmas, self.sigma_mins, self.sigma_maxs, out=sigmas)
+
+        new_genome = np.empty(genome.shape, order="F")
+        new_genome[..., 0] = values + sigmas * \
+                             np.random.standard_normal(sigmas.shape)
+        new_genome[..., 1] = sigmas
+        return new_genome
+
+    def mutate_population(self, genomes):
+        """
+        Mutates an (N, num_genes, 2) array of genomes (e.g.
+        Population.genomes) and returns the new array.
+        """
+        return self.mutate_genome(genomes)
 
     def generator(self):
         while 1:
             ind = self.provider.pull()
-
-            tau_prime_term = self.tau_prime * random.gauss(0,1)
-#            try:
-#                sigmas = ind.sigmas
-#            except AttributeError:
-#                self.num_sigma_sets += 1
-#                sigmas = self.init_sigmas
-#                ind.sigmas = sigmas
-#
-#            for i in range(len(ind.sigmas)):
-#                ##print("self.tau_prime_term =", self.tau_prime_term)
-#                ##print("self.tau =", self.tau)
-#                ##print("ind.sigmas[" + str(i) + "]", ind.sigmas[i])
-#                ind.sigmas[i] *= math.exp( self.tau_prime_term + self.tau * \
-#                                  random.gauss(0,1) )
-#                ##print("self.sigma_bounds =", self.sigma_bounds)
-#                ind.sigmas[i] = np.clip( ind.sigmas[i],
-#                                         self.sigma_bounds[i][0],
-#                                         self.sigma_bounds[i][1] )
-#
-#                ind.genome[i] += ind.sigmas[i] * random.gauss(0,1)
-
-            new_genome = []
-            for i in range(len(ind.genome)):
-                gene = ind.genome[i][0]
-                sigma = ind.genome[i][1]
-                bound = self.sigma_bounds[i]
-#            for g,sd in ind.genome:
-                ##print("self.tau_prime_term =", self.tau_prime_term)
-                ##print("self.tau =", self.tau)
-                ##print("ind.sigmas[" + str(i) + "]", ind.sigmas[i])
-#                ind.sigmas[i] *= math.exp( self.tau_prime_term + self.tau * \
-#                                  random.gauss(0,1) )
-                sigma *= math.exp(tau_prime_term + self.tau*random.gauss(0,1))
-                ##print("self.sigma_bounds =", self.sigma_bounds)
-                sigma = np.clip(sigma, bound[0], bound[1])
-
-                gene += sigma * random.gauss(0,1)
-                new_genome.append( (gene, sigma) )
-
-            ind.genome = new_genome
+            ind.genome = self.mutate_genome(ind.genome)
+            ind.modified = True
             yield ind
 
 
@@ -312,21 +813,149 @@ class CMA_Update(BaseOp):
 #
 #############################################################################
 class UniformCrossover(BaseOp):
+    """
+    With probability p_cross, each pair of genes is swapped between the two
+    parents with probability p_swap.
+
+    When the genomes are numpy arrays, all the swap decisions are made at
+    once with a random mask (drawn from numpy's random generator), and
+    recombine_population() can cross a whole Population's genome matrix in
+    one go.
+    """
+    def __init__(self, provider, p_cross, p_swap=0.5):
+        super().__init__(provider=provider)
+        self.p_cross = p_cross
+        self.p_swap = p_swap
+
+    def swap_mask(self, shape):
+        """
+        Returns a boolean array of the given shape indicating which genes
+        should be swapped.  Any extra dimensions beyond the gene axis are
+        broadcast, so multi-valued genes are swapped as a unit.
+        """
+        return np.random.random_sample(shape) <= self.p_swap
+
+    def recombine_lists(self, ind1, ind2):
+        shared = ind1.shared_genome or ind2.shared_genome
+        copy_on_write = shared
+        for i in range(len(ind1.genome)):
+            if random.random() <= self.p_swap:
+                if same_genes(ind1.genome[i], ind2.genome[i]):
+                    continue
+                if copy_on_write:
+                    # Genes are only moved, not changed, so a shallow copy
+                    # of the genomes will do.
+                    ind1.genome = copy.copy(ind1.genome)
+                    ind2.genome = copy.copy(ind2.genome)
+                    copy_on_write = False
+                (ind1.genome[i], ind2.genome[i]) = \
+                    (ind2.genome[i], ind1.genome[i])
+                ind1.modified = ind2.modified = True
+                if shared and is_iterable(ind1.genome[i]):
+                    # Nested genes are moved, not copied, so both children
+                    # may now hold genes that another individual shares.
+                    ind1.shared_genome = ind2.shared_genome = True
+
+    def recombine_arrays(self, ind1, ind2):
+        genome1, genome2 = ind1.genome, ind2.genome
+        mask = self.swap_mask(len(genome1))
+        mask &= (genome1 != genome2).reshape(len(genome1), -1).any(axis=1)
+        if mask.any():
+            mask = mask.reshape(mask.shape + (1,) * (genome1.ndim - 1))
+            ind1.genome = np.where(mask, genome2, genome1)
+            ind2.genome = np.where(mask, genome1, genome2)
+            ind1.modified = ind2.modified = True
+
+    def recombine_population(self, genomes):
+        """
+        Crosses each pair of rows (0 and 1, 2 and 3, etc.) of a genome array
+        in place, using the same p_cross and p_swap semantics as the
+        generator.  If there is an odd number of rows, the last is left
+        alone.
+
+        @param genomes: An array with one genome per row.
+        @return: A boolean vector indicating which rows were changed.
+        """
+        num_pairs = len(genomes) // 2
+        parents1 = genomes[0 : 2*num_pairs : 2]
+        parents2 = genomes[1 : 2*num_pairs : 2]
+
+        crossed = np.random.random_sample(num_pairs) <= self.p_cross
+        mask = self.swap_mask(parents1.shape[:2]) & crossed[:, np.newaxis]
+        mask &= (parents1 != parents2).reshape(mask.shape + (-1,)).any(axis=2)
+        mask = mask.reshape(mask.shape + (1,) * (genomes.ndim - 2))
+
+        children1 = np.where(mask, parents2, parents1)
+        children2 = np.where(mask, parents1, parents2)
+        genomes[0 : 2*num_pairs : 2] = children1
+        genomes[1 : 2*num_pairs : 2] = children2
+
+        changed = np.zeros(len(genomes), dtype=bool)
+        pair_changed = mask.reshape(num_pairs, -1).any(axis=1)
+        changed[0 : 2*num_pairs : 2] = pair_changed
+        changed[1 : 2*num_pairs : 2] = pair_changed
+        return changed
+
+    def generator(self):
+        while 1:
+            ind1 = self.provider.pull()
+            ind2 = self.provider.pull()
+            assert(len(ind1.genome) == len(ind2.genome))
+            if random.random() <= self.p_cross:
+                if isinstance(ind1.genome, np.ndarray) and \
+                   isinstance(ind2.genome, np.ndarray):
+                    self.recombine_arrays(ind1, ind2)
+                else:
+                    self.recombine_lists(ind1, ind2)
+
+            yield ind1
+            yield ind2
+
+
+#############################################################################
+#
+# PackedUniformCrossover
+#
+#############################################################################
+class PackedUniformCrossover(BaseOp):
+    """
+    Uniform crossover for genomes from the PackedBinaryCoder.  A packed mask
+    of bits to swap is generated, and the swap is done a word at a time.
+    """
     def __init__(self, provider, p_cross, p_swap=0.5):
         super().__init__(provider=provider)
         self.p_cross = p_cross
         self.p_swap = p_swap
 
+    def swap_mask(self, num_bits):
+        if self.p_swap == 0.5:
+            # Every bit of a random word is already a fair coin flip
+            num_words = (num_bits + 7) // 8
+            data = random.getrandbits(8 * num_words)
+            mask = np.frombuffer(data.to_bytes(num_words, "big"),
+                                 dtype=np.uint8)
+        else:
+            mask = np.packbits(np.random.random_sample(num_bits) <=
+                               self.p_swap)
+        return mask
+
+    def recombine(self, ind1, ind2):
+        genome1, genome2 = ind1.genome, ind2.genome
+        mask = self.swap_mask(ind1.genetic_coder.genome_size)
+        mask = mask & (genome1 ^ genome2)   # Only bits that actually differ
+        if mask.any():
+            ind1.genome = genome1 ^ mask
+            ind2.genome = genome2 ^ mask
+            ind1.modified = ind2.modified = True
+        return (ind1, ind2)
+
     def generator(self):
         while 1:
             ind1 = self.provider.pull()
             ind2 = self.provider.pull()
             assert(len(ind1.genome) == len(ind2.genome))
             if random.random() <= self.p_cross:
-                for i in range(len(ind1.genome)):
-                    if random.random() <= self.p_swap:
-                        (ind1.genome[i], ind2.genome[i]) = \
-                            (ind2.genome[i], ind1.genome[i])
+                self.recombine(ind1, ind2)
 
             yield ind1
             yield ind2
@@ -371,8 +1000,7 @@ class NPointCrossover(BaseOp):
         Randomly choose (without replacement) crossover points.
         """
         min_xover_ind = int(not self.xover_at_0)
-        pp = list(range(min_xover_ind,genomeSize))
-        xpts = [pp.pop(random.randrange(len(pp))) for i in range(num_points)]
+        xpts = random.sample(range(min_xover_ind, genomeSize), num_points)
         xpts.sort()
         xpts = [0] + xpts + [genomeSize]  # Add start and end
         return xpts
@@ -388,26 +1016,90 @@ class NPointCrossover(BaseOp):
         assert(len(ind1.genome) == len(ind2.genome))
         assert(len(ind1.genome) >= self.num_points + 1-int(self.xover_at_0))
 
-        genome1 = ind1.genome[0:0]  # empty sequence - maintain type
-        genome2 = ind2.genome[0:0]
-        src1 = random.randrange(2)
-        src2 = 1-src1
         individuals = [ind1, ind2]
+        src1 = random.randrange(2)
+        parent1 = individuals[src1].genome
+        parent2 = individuals[1-src1].genome
+
+        # Start each child as a copy of one parent (which also maintains the
+        # type), then overwrite every other segment from the other parent.
+        genome1 = copy.copy(parent1)
+        genome2 = copy.copy(parent2)
 
         # Pick crossover points
         xpts = self.pickCrossoverPoints(self.num_points, len(ind1.genome))
 
         # Perform the crossover
-        for i in range(len(xpts)-1):  # swap odd segments
-            genome1 += individuals[src1].genome[xpts[i]:xpts[i+1]]
-            genome2 += individuals[src2].genome[xpts[i]:xpts[i+1]]
-            src1, src2 = src2, src1
-
+        for i in range(1, len(xpts)-1, 2):  # swap odd segments
+            genome1[xpts[i]:xpts[i+1]] = parent2[xpts[i]:xpts[i+1]]
+            genome2[xpts[i]:xpts[i+1]] = parent1[xpts[i]:xpts[i+1]]
+
+        if not same_genes(genome1, ind1.genome):
+            ind1.modified = True
+        if not same_genes(genome2, ind2.genome):
+            ind2.modified = True
         ind1.genome = genome1
         ind2.genome = genome2
 
+        # The copies are shallow, so nested genes from a shared genome are
+        # still shared, whichever child they ended up in.
+        if (ind1.shared_genome or ind2.shared_genome) and \
+           not isinstance(genome1, np.ndarray) and \
+           len(genome1) > 0 and is_iterable(genome1[0]):
+            ind1.shared_genome = ind2.shared_genome = True
+
         return (ind1, ind2)
 
+
+    def recombine_population(self, genomes):
+        """
+        Crosses each pair of rows (0 and 1, 2 and 3, etc.) of a genome array
+        in place.  Each pair is crossed with probability p_cross, using
+        num_points crossover points chosen independently for every pair.  If
+        there is an odd number of rows, the last is left alone.
+
+        @param genomes: An array with one genome per row.
+        @return: A boolean vector indicating which rows were changed.
+        """
+        num_pairs = len(genomes) // 2
+        genome_size = genomes.shape[1]
+        min_xover_ind = int(not self.xover_at_0)
+        assert(genome_size >= self.num_points + min_xover_ind)
+
+        # Choose points by taking the smallest num_points of a set of random
+        # keys, which is an unbiased sample without replacement for each row.
+        keys = np.random.random_sample((num_pairs,
+                                        genome_size - min_xover_ind))
+        xpts = np.argpartition(keys, self.num_points - 1, axis=1)
+        xpts = xpts[:, :self.num_points] + min_xover_ind
+
+        # Each crossover point toggles which parent the genes come from.
+        toggles = np.zeros((num_pairs, genome_size), dtype=np.int8)
+        np.put_along_axis(toggles, xpts, 1, axis=1)
+        mask = np.cumsum(toggles, axis=1) % 2 == 1
+
+        # Randomly choose which parent each child starts with.
+        flipped = np.random.random_sample(num_pairs) < 0.5
+        mask ^= flipped[:, np.newaxis]
+        crossed = np.random.random_sample(num_pairs) <= self.p_cross
+        mask &= crossed[:, np.newaxis]
+        mask = mask.reshape(mask.shape + (1,) * (genomes.ndim - 2))
+
+        parents1 = genomes[0 : 2*num_pairs : 2]
+        parents2 = genomes[1 : 2*num_pairs : 2]
+        children1 = np.where(mask, parents2, parents1)
+        children2 = np.where(mask, parents1, parents2)
+
+        changed = np.zeros(len(genomes), dtype=bool)
+        changed[0 : 2*num_pairs : 2] = \
+            (children1 != parents1).reshape(num_pairs, -1).any(axis=1)
+        changed[1 : 2*num_pairs : 2] = \
+            (children2 != parents2).reshape(num_pairs, -1).any(axis=1)
+
+        genomes[0 : 2*num_pairs : 2] = children1
+        genomes[1 : 2*num_pairs : 2] = children2
+        return changed
+
     def generator(self):
         while 1:
             ind1 = self.provider.pull()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+
+"""
+population.py: defines an array based population class for Eclypse
+"""
+
+import os
+import math
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from eclypse.ind import Individual, IndividualContext
+
+
+#############################################################################
+#
+# fitness_type
+#
+#############################################################################
+def fitness_type(fitnesses):
+    """
+    Returns int if every fitness (ignoring None) is an integer, and float
+    otherwise.  Fitnesses stored in float arrays are converted back with it,
+    so that integer fitnesses keep their type.
+    """
+    if all(f is None or (isinstance(f, (int, np.integer)) and
+                         not isinstance(f, bool)) for f in fitnesses):
+        return int
+    return float
+
+
+#############################################################################
+#
+# IndividualView
+#
+#############################################################################
+class IndividualView(Individual):
+    """
+    A lightweight Individual that refers to one row of a Population.  The
+    genome is a view into the population's genome array, and the fitness
+    lives in the population's fitness vector, so changes made through the
+    view change the population itself.
+
+    Views can be used anywhere an Individual can (selection, survival,
+    operators).  Cloning a view produces a regular, independent Individual.
+    """
+    __slots__ = ("population", "index")
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+        self.context = IndividualContext.get(population.problem,
+                                             population.genetic_coder)
+
+    @property
+    def genome(self):
+        return self.population.genomes[self.index]
+
+    @genome.setter
+    def genome(self, genome):
+        self.population.genomes[self.index] = genome
+
+    @property
+    def fitness(self):
+        fitness = self.population.fitness[self.index]
+        if np.isnan(fitness):
+            return None
+        return self.population.fitness_type(fitness.item())
+
+    @fitness.setter
+    def fitness(self, fitness):
+        if fitness is None:
+            fitness = np.nan
+        elif fitness_type([fitness]) is float:
+            self.population.fitness_type = float
+        self.population.fitness[self.index] = fitness
+
+    @property
+    def modified(self):
+        return bool(self.population.modified[self.index])
+
+    @modified.setter
+    def modified(self, modified):
+        self.population.modified[self.index] = modified
+
+    @property
+    def shared_genome(self):
+        # The genome belongs to the population, and operators applied to a
+        # view (rather than a clone) are meant to change it in place.
+        return False
+
+    def size(self):
+        return self.genetic_coder.count_genes(self.genome)
+
+    def decode(self):
+        # Views are created on the fly, so there is nowhere to cache this
+        return self.genetic_coder.decode_genome(self.genome)
+
+    def clone(self, copy_on_write=False):
+        # The genome is always copied, since the population's array may be
+        # changed in place.
+        clone = Individual(self.problem, self.genetic_coder,
+                           self.genome.copy())
+        clone.fitness = self.fitness
+        clone.modified = self.modified
+        return clone
+
+
+#############################################################################
+#
+# Population
+#
+#############################################################################
+class Population():
+    """
+    Stores the genomes of a population of fixed length individuals as a
+    single numpy array (one genome per row), along with a vector of fitness
+    values.  This uses far less memory than a list of Individuals with
+    python list genomes, and allows operations on the whole population to be
+    written as array operations.
+
+    Only scalar fitness values are supported.  Unevaluated individuals have a
+    fitness of NaN in the fitness vector.  Integer fitnesses are stored as
+    floats (exact up to 2**53), and given back as ints as long as every
+    fitness stored has been an integer (see fitness_type).
+
+    A Population acts like a list of IndividualViews, so it can be passed
+    directly to new_generation() on any pipeline.
+    """
+    def __init__(self, problem, genetic_coder, genomes, fitness=None):
+        """
+        @param problem: The problem shared by all the individuals.
+        @param genetic_coder: The coder shared by all the individuals.
+        @param genomes: An array with one genome per row.
+        @param fitness: An optional vector of fitness values.
+        """
+        self.problem = problem
+        self.genetic_coder = genetic_coder
+        self.genomes = np.asarray(genomes,
+                                  dtype=genetic_coder.genome_dtype)
+        if fitness is None:
+            self.fitness = np.full(len(self.genomes), np.nan)
+            self.modified = np.ones(len(self.genomes), dtype=bool)
+            self.fitness_type = int
+        else:
+            self.fitness_type = fitness_type(fitness)
+            self.fitness = np.array([np.nan if f is None else f
+                                     for f in fitness], dtype=float)
+            self.modified = np.isnan(self.fitness)
+
+    @classmethod
+    def random(cls, problem, genetic_coder, size):
+        """
+        Creates a population of random genomes.
+        """
+        genomes = [genetic_coder.create_random_genome() for _ in range(size)]
+        return cls(problem, genetic_coder, genomes)
+
+    @classmethod
+    def from_individuals(cls, individuals):
+        """
+        Copies the genomes and fitnesses of a list of Individuals (which must
+        all share the same problem and coder) into a new Population.
+        """
+        problem = individuals[0].problem
+        genetic_coder = individuals[0].genetic_coder
+        population = cls(problem, genetic_coder,
+                         [ind.genome for ind in individuals])
+        for i, ind in enumerate(individuals):
+            population[i].fitness = ind.fitness
+            population.modified[i] = ind.modified
+        return population
+
+    def to_individuals(self):
+        """
+        Returns a list of regular Individuals, independent of this
+        population.
+        """
+        return [view.clone() for view in self]
+
+    def __len__(self):
+        return len(self.genomes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [IndividualView(self, i)
+                    for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Population index out of range")
+        return IndividualView(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield IndividualView(self, i)
+
+    def evaluate(self):
+        """
+        Evaluates every modified individual in the population with a single
+        call to the problem's evaluate_batch() method.
+        """
+        rows = np.flatnonzero(self.modified)
+        if len(rows) == 0:
+            return
+        phenomes = self.genetic_coder.decode_population(self.genomes[rows])
+        fitnesses = self.problem.evaluate_batch(phenomes)
+        if fitness_type(fitnesses) is float:
+            self.fitness_type = float
+        self.fitness[rows] = fitnesses
+        self.modified[rows] = False
+
+
+#############################################################################
+#
+# SharedPopulation
+#
+#############################################################################
+class SharedPopulation(Population):
+    """
+    A Population whose genome, fitness and modified arrays are stored in
+    multiprocessing.shared_memory segments, so that worker processes can
+    read genomes and write fitnesses without anything being pickled.  The
+    workers receive only a small handle() and a range of rows.  See
+    evaluate_parallel().
+
+    The segments must be freed with release() when the population is no
+    longer needed (or use it as a context manager).
+    """
+    def __init__(self, problem, genetic_coder, genomes, fitness=None):
+        super().__init__(problem, genetic_coder, genomes, fitness)
+        self.segments = []
+        self.genomes = self.share(self.genomes)
+        self.fitness = self.share(self.fitness)
+        self.modified = self.share(self.modified)
+
+    def share(self, array):
+        """
+        Returns a copy of array that lives in a new shared memory segment.
+        """
+        segment = shared_memory.SharedMemory(create=True,
+                                             size=max(array.nbytes, 1))
+        self.segments.append(segment)
+        shared_array = np.ndarray(array.shape, dtype=array.dtype,
+                                  buffer=segment.buf)
+        shared_array[...] = array
+        return shared_array
+
+    def handle(self):
+        """
+        Returns a small, picklable description of the shared arrays, which
+        attach_shared_arrays() uses to find them again in another process.
+        """
+        return tuple((segment.name, array.shape, array.dtype.str)
+                     for segment, array in zip(self.segments,
+                                               [self.genomes, self.fitness,
+                                                self.modified]))
+
+    def evaluate_parallel(self, executor, num_rows=None, chunk_size=None):
+        """
+        Evaluates the modified individuals among the first num_rows rows
+        using worker processes.  Each task sent to the executor is just the
+        handle and a range of rows, no matter how large the genomes are.
+
+        @param executor: An executor created by shared_executor() for this
+                         population's problem and coder.
+        @param num_rows: Only rows before this one are considered.  The
+                         default is the whole population.
+        @param chunk_size: The number of rows in each task.  By default the
+                           rows are split into about 4 tasks per core.
+        """
+        if num_rows is None:
+            num_rows = len(self)
+        if chunk_size is None:
+            num_cores = os.cpu_count() or 1     # None if it can't be found
+            chunk_size = max(1, math.ceil(num_rows / (4 * num_cores)))
+
+        handle = self.handle()
+        futures = [executor.submit(evaluate_shared_rows, handle, start,
+                                   min(start + chunk_size, num_rows))
+                   for start in range(0, num_rows, chunk_size)]
+        for future in futures:
+            # This also makes sure any exceptions are raised
+            if future.result() is float:
+                self.fitness_type = float
+
+    def release(self):
+        """
+        Frees the shared memory segments.  The population can't be used
+        afterwards.
+        """
+        self.genomes = self.fitness = self.modified = None
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+#############################################################################
+#
+# Shared memory worker functions
+#
+# These run inside the worker processes.  The problem and coder are sent
+# once, when each worker starts, rather than with every task.
+#
+#############################################################################
+_worker_context = None
+_worker_segments = {}
+
+
+def shared_executor(problem, genetic_coder, max_workers=None):
+    """
+    Creates a process pool whose workers can evaluate SharedPopulations
+    that use this problem and coder.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               initializer=init_shared_worker,
+                               initargs=(problem, genetic_coder))
+
+
+def init_shared_worker(problem, genetic_coder):
+    global _worker_context
+    _worker_context = IndividualContext(problem, genetic_coder)
+
+
+def attach_shared_arrays(handle):
+    """
+    Returns the arrays described by a SharedPopulation handle.  Segments are
+    kept open between tasks, and any that belong to an old handle are
+    closed.
+    """
+    names = [name for name, shape, dtype in handle]
+    for name in list(_worker_segments):
+        if name not in names:
+            _worker_segments.pop(name).close()
+
+    arrays = []
+    for name, shape, dtype in handle:
+        segment = _worker_segments.get(name)
+        if segment is None:
+            try:
+                segment = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:   # Before python 3.13
+                segment = shared_memory.SharedMemory(name=name)
+            _worker_segments[name] = segment
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+    return arrays
+
+
+def evaluate_shared_rows(handle, start, stop):
+    """
+    Evaluates the modified rows in range(start, stop) of a SharedPopulation,
+    writing the fitnesses directly into the shared fitness array.  Returns
+    the fitness_type() of the new fitnesses.
+    """
+    genomes, fitness, modified = attach_shared_arrays(handle)
+    rows = start + np.flatnonzero(modified[start:stop])
+    if len(rows) == 0:
+        return int
+    coder = _worker_context.genetic_coder
+    phenomes = coder.decode_population(genomes[rows])
+    fitnesses = _worker_context.problem.evaluate_batch(phenomes)
+    fitness[rows] = fitnesses
+    modified[rows] = False
+    return fitness_type(fitnesses)
+
+
+#############################################################################
+#
+# unit_test
+#
+#############################################################################
+if __name__ == "__main__":
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+
+    problem = SimilarityProblem([1,1,1,1,1])  # OneMax
+    coder = BinaryCoder(5)
+    population = Population(problem, coder, [[0,0,0,0,0], [1,1,1,1,1]])
+    population.evaluate()
+
+    assert(population[1].better_than(population[0]))
+    assert(population.fitness.tolist() == [0.0, 5.0])
+    assert(population[1].fitness == 5 and type(population[1].fitness) is int)
+    print("passed")
@@ -6,6 +6,11 @@ problems.py: defines common problems for Eclypse
 
 import random
 import copy
+import inspect
+
+import numpy as np
+
+from eclypse.coders import PackedBits, popcount
 
 
 #############################################################################
@@ -17,6 +22,23 @@ class BaseProblem():
     def evaluate(self, phenome):
         raise NotImplementedError
 
+    async def evaluate_async(self, phenome):
+        """
+        A coroutine version of evaluate(), used by the AsyncEvaluate
+        operator.  Problems that spend their time waiting on I/O should
+        override this and await on the I/O.  The default just calls
+        evaluate(), which will block the event loop while it runs.
+        """
+        return self.evaluate(phenome)
+
+    def evaluate_batch(self, phenomes):
+        """
+        Evaluates a list of phenomes and returns a list of their fitnesses.
+        Problems that can evaluate many phenomes more cheaply at once than
+        one at a time should override this.
+        """
+        return [self.evaluate(phenome) for phenome in phenomes]
+
     def better_than(self, fit1, fit2):
         raise NotImplementedError
 
@@ -34,12 +56,48 @@ class BaseProblem():
 #
 #############################################################################
 class SimilarityProblem(BaseProblem):
+    """
+    Phenomes from the PackedBinaryCoder are compared a word at a time, by
+    counting the bits that differ after XORing with the packed target.
+    """
     def __init__(self, target):
         self.target = target
+        self.packed_target = None
+
+    def get_packed_target(self):
+        if self.packed_target is None:
+            self.packed_target = np.packbits(np.asarray(self.target,
+                                                        dtype=bool))
+        return self.packed_target
 
     def evaluate(self, phenome):
+        if isinstance(phenome, PackedBits):
+            mismatches = popcount(phenome.words ^ self.get_packed_target())
+            return phenome.num_bits - int(mismatches)
         return sum([p == t for p,t in zip(phenome, self.target)])
 
+    def evaluate_batch(self, phenomes):
+        if len(phenomes) > 0 and isinstance(phenomes[0], PackedBits):
+            words = np.stack([phenome.words for phenome in phenomes])
+            mismatches = popcount(words ^ self.get_packed_target(), axis=1)
+            return (phenomes[0].num_bits - mismatches).tolist()
+        # Only rectangular arrays of numbers are compared all at once.
+        # Anything else (ragged phenomes, strings, objects) goes through
+        # evaluate(), so the results are always the same.
+        try:
+            array = np.asarray(phenomes)
+            target = np.asarray(self.target)
+        except ValueError:      # Ragged
+            return super().evaluate_batch(phenomes)
+        if array.ndim != 2 or target.ndim != 1 or \
+           array.dtype.kind not in "biuf" or target.dtype.kind not in "biuf":
+            return super().evaluate_batch(phenomes)
+
+        # Like evaluate(), only compare as many genes as both have
+        length = min(array.shape[1], len(target))
+        matches = array[:, :length] == target[:length]
+        return matches.sum(axis=1).tolist()
+
     def better_than(self, fit1, fit2):
         return fit1 > fit2
 
@@ -53,15 +111,45 @@ class SimilarityProblem(BaseProblem):
 #
 #############################################################################
 class FuncOptProblem(BaseProblem):
-    "A general purpose class for function optimization problems."
-    def __init__(self, function, maximize=True):
+    """
+    A general purpose class for function optimization problems.
+
+    If vectorized is True, the function must take a 2-D numpy array with one
+    phenome per row, and return an array with one fitness per row.  This
+    allows evaluate_batch() to evaluate a whole generation in a single call.
+    """
+    def __init__(self, function, maximize=True, vectorized=False):
         self.function = function
         self.maximize = maximize
+        self.vectorized = vectorized
 
     def evaluate(self, phenome):
+        if self.vectorized:
+            return self.evaluate_batch([phenome])[0]
         fitness = self.function(phenome)
         return fitness
 
+    def evaluate_batch(self, phenomes):
+        if not self.vectorized:
+            return super().evaluate_batch(phenomes)
+        fitnesses = self.function(np.asarray(phenomes, dtype=float))
+        return np.asarray(fitnesses).tolist()
+
+    async def evaluate_async(self, phenome):
+        """
+        The function may be either a regular function or a coroutine
+        function (i.e. defined with "async def").
+        """
+        if self.vectorized:
+            fitness = self.function(np.asarray([phenome], dtype=float))
+        else:
+            fitness = self.function(phenome)
+        if inspect.isawaitable(fitness):
+            fitness = await fitness
+        if self.vectorized:
+            fitness = np.asarray(fitness).tolist()[0]
+        return fitness
+
     def better_than(self, fit1, fit2):
         if self.maximize:
             return fit1 > fit2
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+"""
+profiler.py: measures where the time goes in a pipeline for Eclypse
+"""
+
+import time
+import tracemalloc
+
+from eclypse.ops import BaseOp
+
+
+#############################################################################
+#
+# OpStats
+#
+#############################################################################
+class OpStats():
+    """
+    The measurements for one operator.  Cumulative time includes the time
+    spent in the operators it pulls from, exclusive time doesn't.
+    Allocated is the net number of bytes allocated (only when allocations
+    are being tracked).
+    """
+    __slots__ = ("pulls", "cumulative", "exclusive", "allocated")
+
+    def __init__(self):
+        self.pulls = 0
+        self.cumulative = 0.0
+        self.exclusive = 0.0
+        self.allocated = 0
+
+    def add(self, other):
+        self.pulls += other.pulls
+        self.cumulative += other.cumulative
+        self.exclusive += other.exclusive
+        self.allocated += other.allocated
+
+
+#############################################################################
+#
+# PipelineProfiler
+#
+#############################################################################
+class PipelineProfiler():
+    """
+    Records, for every operator in a pipeline, how many times pull() was
+    called and how long it took.  Optionally it also tracks the memory
+    allocated (using tracemalloc, which slows things down considerably).
+
+    Profiling is opt in.  enable() replaces each operator's pull() with a
+    timing wrapper (by setting an instance attribute), and disable() removes
+    the wrappers again, so a pipeline that isn't being profiled runs exactly
+    the same code as before.
+
+    The pipeline is explored starting from the last operator, following the
+    providers, and any other operators stored as attributes (such as the
+    DeterministicSelection inside TournamentSelection).
+
+    Call end_generation() after each generation to save the measurements
+    for that generation in history.  A profiler can be passed directly to
+    GenerationalEA as a callback, which does this.
+    """
+    def __init__(self, pipeline, track_allocations=False):
+        """
+        @param pipeline: The last operator in the pipeline.
+        @param track_allocations: If True, record memory allocations too.
+        """
+        self.pipeline = pipeline
+        self.track_allocations = track_allocations
+        self.tree = pipeline_tree(pipeline)
+        self.ops = [op for depth, label, op in self.tree]
+        self.stats = {op: OpStats() for op in self.ops}    # This generation
+        self.totals = {op: OpStats() for op in self.ops}
+        self.history = []
+        self.enabled = False
+        self.started_tracemalloc = False
+        self.stack = []
+
+    def enable(self):
+        if self.enabled:
+            return
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        for op in self.ops:
+            op.pull = self.make_wrapper(op)
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for op in self.ops:
+            if "pull" in vars(op):
+                del op.pull
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.disable()
+
+    def __call__(self, ea):
+        self.end_generation()
+
+    def make_wrapper(self, op):
+        pull = op.pull
+        stats = self.stats[op]
+        stack = self.stack      # Time (and memory) used by nested pulls
+        clock = time.perf_counter
+
+        if self.track_allocations:
+            traced = tracemalloc.get_traced_memory
+
+            def profiled_pull():
+                stats.pulls += 1
+                stack.append([0.0, 0])
+                memory = traced()[0]
+                start = clock()
+                try:
+                    return pull()
+                finally:
+                    elapsed = clock() - start
+                    allocated = traced()[0] - memory
+                    nested_time, nested_memory = stack.pop()
+                    stats.cumulative += elapsed
+                    stats.exclusive += elapsed - nested_time
+                    stats.allocated += allocated - nested_memory
+                    if stack:
+                        stack[-1][0] += elapsed
+                        stack[-1][1] += allocated
+        else:
+            def profiled_pull():
+                stats.pulls += 1
+                stack.append(0.0)
+                start = clock()
+                try:
+                    return pull()
+                finally:
+                    elapsed = clock() - start
+                    stats.cumulative += elapsed
+                    stats.exclusive += elapsed - stack.pop()
+                    if stack:
+                        stack[-1] += elapsed
+        return profiled_pull
+
+    def end_generation(self):
+        """
+        Moves the measurements for the current generation into history.
+        """
+        generation = {}
+        for op in self.ops:
+            stats = self.stats[op]
+            self.totals[op].add(stats)
+            generation[op] = OpStats()
+            generation[op].add(stats)
+            stats.pulls = stats.allocated = 0
+            stats.cumulative = stats.exclusive = 0.0
+        self.history.append(generation)
+
+    def report(self, generation=None):
+        """
+        Returns the pipeline as a tree, with the measurements for each
+        operator.  By default the totals for the whole run are shown
+        (including the current generation), otherwise those for
+        history[generation].
+        """
+        if generation is None:
+            stats = {op: OpStats() for op in self.ops}
+            for op in self.ops:
+                stats[op].add(self.totals[op])
+                stats[op].add(self.stats[op])
+        else:
+            stats = self.history[generation]
+
+        width = max(len("  " * depth + label)
+                    for depth, label, op in self.tree)
+        header = "%-*s %9s %10s %10s" % (width, "operator", "pulls",
+                                         "cum (s)", "excl (s)")
+        if self.track_allocations:
+            header += " %12s" % "alloc (KB)"
+        lines = [header]
+        for depth, label, op in self.tree:
+            s = stats[op]
+            line = "%-*s %9d %10.4f %10.4f" % (width, "  " * depth + label,
+                                              s.pulls, s.cumulative,
+                                              s.exclusive)
+            if self.track_allocations:
+                line += " %12.1f" % (s.allocated / 1024.0)
+            lines.append(line)
+        return "\n".join(lines)
+
+
+#############################################################################
+#
+# pipeline_tree
+#
+#############################################################################
+def pipeline_tree(pipeline):
+    """
+    Returns a list of (depth, label, op) for every operator in the pipeline,
+    in the order they should be printed.  The provider of each operator is
+    its first child.  Other operators held in attributes follow, labelled
+    with the attribute name.
+    """
+    tree = []
+    seen = set()
+    stack = [(0, type(pipeline).__name__, pipeline)]
+    while stack:
+        depth, label, op = stack.pop()
+        if id(op) in seen:
+            continue
+        seen.add(id(op))
+        tree.append((depth, label, op))
+
+        children = []
+        provider = getattr(op, "provider", None)
+        if isinstance(provider, BaseOp):
+            children.append((depth + 1, type(provider).__name__, provider))
+        for name, value in vars(op).items():
+            if name != "provider" and isinstance(value, BaseOp):
+                children.append((depth + 1, "%s (%s)" %
+                                 (type(value).__name__, name), value))
+        stack.extend(reversed(children))
+    return tree
+
+
+#############################################################################
+#
+# unit_test
+#
+#############################################################################
+if __name__ == "__main__":
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, UniformCrossover, BitFlipMutation, Evaluate
+    from eclypse.survive import Elitism
+    from eclypse.ea import GenerationalEA
+
+    problem = SimilarityProblem([1] * 100)  # Max Ones
+    coder = BinaryCoder(100)
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = Clone(pipeline)
+    pipeline = UniformCrossover(pipeline, p_cross=1.0, p_swap=0.5)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.01)
+    pipeline = Evaluate(pipeline)
+    pipeline = Elitism(pipeline, num_elite=1)
+
+    profiler = PipelineProfiler(pipeline, track_allocations=True)
+    with profiler:
+        GenerationalEA(problem, coder, pipeline, 100, 20,
+                       callbacks=[profiler]).run()
+    print(profiler.report())
+    assert(profiler.totals[pipeline].pulls == 2000)
+    print("passed")
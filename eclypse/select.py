@@ -104,12 +104,15 @@ class DeterministicSelection(BaseSelection):
         self.shuffle = shuffle
 
     def generator(self):
-        shuffled_pop = self.prior_generation[:]
+        # Shuffle indices rather than a copy of the population, so that
+        # changes made to the population in place (e.g. by SteadyStateEA)
+        # are seen straight away.
+        order = list(range(len(self.prior_generation)))
         while 1:
             if self.shuffle:
-                random.shuffle(shuffled_pop)
-            for ind in shuffled_pop:
-                yield ind
+                random.shuffle(order)
+            for i in order:
+                yield self.prior_generation[i]
 
 
 
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+"""
+termination.py: defines stopping criteria for the EAs in Eclypse
+"""
+
+import time
+
+import numpy as np
+
+
+#############################################################################
+#
+# BaseTermination
+#
+#############################################################################
+class BaseTermination():
+    """
+    A stopping criterion for GenerationalEA or SteadyStateEA.  The EA calls
+    start() when a run begins, and done() at the end of every generation
+    (or after every insertion, for SteadyStateEA).  The run stops as soon
+    as done() returns True.
+
+    Criteria can be combined: (a | b) stops when either is met, and (a & b)
+    only when both are.
+
+    The EA is passed to every call, and criteria can use its problem,
+    population, bsf (best so far), generation and evaluations attributes.
+
+    Criteria that keep track of things as they go should return them from
+    get_state(), as something JSON serializable, and take them back in
+    set_state().  GenerationalEA saves the state in its checkpoints, so a
+    resumed run stops when the uninterrupted run would have.
+    """
+    def start(self, ea):
+        pass
+
+    def done(self, ea):
+        raise NotImplementedError
+
+    def get_state(self):
+        return None
+
+    def set_state(self, state):
+        pass
+
+    def __or__(self, other):
+        return AnyTermination([self, other])
+
+    def __and__(self, other):
+        return AllTermination([self, other])
+
+
+class AnyTermination(BaseTermination):
+    def __init__(self, criteria):
+        self.criteria = criteria
+
+    def start(self, ea):
+        for criterion in self.criteria:
+            criterion.start(ea)
+
+    def done(self, ea):
+        # Check them all, since some keep track of things as they go
+        results = [criterion.done(ea) for criterion in self.criteria]
+        return any(results)
+
+    def get_state(self):
+        return [criterion.get_state() for criterion in self.criteria]
+
+    def set_state(self, state):
+        for criterion, criterion_state in zip(self.criteria, state):
+            criterion.set_state(criterion_state)
+
+
+class AllTermination(AnyTermination):
+    def done(self, ea):
+        results = [criterion.done(ea) for criterion in self.criteria]
+        return all(results)
+
+
+#############################################################################
+#
+# TargetFitness
+#
+#############################################################################
+class TargetFitness(BaseTermination):
+    """
+    Stops once the best so far is at least as good as target.
+    """
+    def __init__(self, target):
+        self.target = target
+
+    def done(self, ea):
+        if ea.bsf is None or ea.bsf.fitness is None:
+            return False
+        return not ea.problem.better_than(self.target, ea.bsf.fitness)
+
+
+#############################################################################
+#
+# Stagnation
+#
+#############################################################################
+class Stagnation(BaseTermination):
+    """
+    Stops when the best so far hasn't improved for a number of generations.
+    """
+    def __init__(self, generations):
+        self.generations = generations
+
+    def start(self, ea):
+        self.best = None
+        self.last_improvement = None
+
+    def done(self, ea):
+        if ea.bsf is None:
+            return False
+        if self.best is None or \
+           ea.problem.better_than(ea.bsf.fitness, self.best):
+            self.best = ea.bsf.fitness
+            self.last_improvement = ea.generation
+        return ea.generation - self.last_improvement >= self.generations
+
+    def get_state(self):
+        return [self.best, self.last_improvement]
+
+    def set_state(self, state):
+        self.best, self.last_improvement = state
+
+
+#############################################################################
+#
+# MaxEvaluations
+#
+#############################################################################
+class MaxEvaluations(BaseTermination):
+    """
+    Stops once the fitness function has been called at least
+    max_evaluations times.  The EAs count every evaluation, including the
+    initial population, but not fitnesses found in a FitnessCache.
+
+    Like any criterion, the budget is only checked at the end of each
+    generation (after each insertion for SteadyStateEA), so a GenerationalEA
+    can overshoot it by up to one generation's evaluations, and a
+    SteadyStateEA by the evaluations still in flight.
+    """
+    def __init__(self, max_evaluations):
+        self.max_evaluations = max_evaluations
+
+    def done(self, ea):
+        return ea.evaluations >= self.max_evaluations
+
+
+#############################################################################
+#
+# WallClock
+#
+#############################################################################
+class WallClock(BaseTermination):
+    """
+    Stops once the run has taken at least seconds.  When a run is resumed
+    from a checkpoint, the time taken before the checkpoint counts too.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def start(self, ea):
+        self.start_time = time.monotonic()
+
+    def done(self, ea):
+        return time.monotonic() - self.start_time >= self.seconds
+
+    def get_state(self):
+        return time.monotonic() - self.start_time   # Elapsed so far
+
+    def set_state(self, state):
+        self.start_time = time.monotonic() - state
+
+
+#############################################################################
+#
+# DiversityCollapse
+#
+#############################################################################
+class DiversityCollapse(BaseTermination):
+    """
+    Stops when the diversity of the population falls to threshold or below.
+
+    For fixed length numeric genomes, diversity is the standard deviation of
+    each gene across the population, averaged over the genes.  Otherwise it
+    is the fraction of genomes that are distinct.
+    """
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def done(self, ea):
+        return population_diversity(ea.population) <= self.threshold
+
+
+def population_diversity(population):
+    genomes = [ind.genome for ind in population]
+    try:
+        genomes = np.asarray(genomes, dtype=float)
+    except (ValueError, TypeError):     # Ragged, or not numbers
+        coder = population[0].genetic_coder
+        keys = set(coder.genome_key(genome) for genome in genomes)
+        return (len(keys) - 1) / max(len(genomes) - 1, 1)
+    return float(genomes.std(axis=0).mean())
+
+
+#############################################################################
+#
+# unit_test
+#
+#############################################################################
+if __name__ == "__main__":
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+
+    class FakeEA():
+        problem = SimilarityProblem([1,1,1,1,1])  # OneMax
+        coder = BinaryCoder(5)
+        population = [Individual(problem, coder, [1,1,1,1,1])] * 2
+        bsf = population[0]
+        generation = 0
+        evaluations = 10
+
+    ea = FakeEA()
+    ea.bsf.evaluate()
+    criterion = TargetFitness(5) & MaxEvaluations(10)
+    criterion.start(ea)
+    assert(criterion.done(ea))
+    assert(DiversityCollapse(0.0).done(ea))
+    print("passed")
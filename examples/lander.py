@@ -170,7 +170,8 @@ def lander():
 -0.7051018696605849, 0.10893345133386723]]
 
     print(rules)
-    exec_phenome = coder.decode_genome(rules)
+    bsf = Individual(None, coder, rules)
+    exec_phenome = bsf.decode()
 
     # Show the solution in the simulation
     env = gym.make(sim_name)
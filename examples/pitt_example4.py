@@ -103,7 +103,7 @@ def pitt_example4():
         bsf_last_fitness = bsf.fitness
 
     print(bsf)
-    exec_phenome = bsf.genetic_coder.decode_genome(bsf.genome)
+    exec_phenome = bsf.decode()
 
     # Show the solution in the simulation
     env = gym.make(sim_name)
@@ -102,7 +102,7 @@ def pitt_example5():
         bsf_last_fitness = bsf.fitness
 
     print(bsf)
-    exec_phenome = bsf.genetic_coder.decode_genome(bsf.genome)
+    exec_phenome = bsf.decode()
 
 
 
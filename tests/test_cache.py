@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+"""
+test_cache.py: tests the fitness cache for Eclypse
+"""
+
+
+def test_FitnessCache():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.cache import FitnessCache
+
+    problem = SimilarityProblem([1,1,1,1,1])  # OneMax
+    coder = BinaryCoder(5)
+    cache = FitnessCache(capacity=2)
+
+    ind1 = Individual(problem, coder, [0,0,0,1,1])
+    ind2 = ind1.clone()
+    ind3 = Individual(problem, coder, [1,1,1,1,1])
+    ind4 = Individual(problem, coder, [0,0,0,0,0])
+
+    ind1.evaluate(cache)
+    ind2.evaluate(cache)
+    assert(ind2.fitness == 2)
+    assert(cache.hits == 1 and cache.misses == 1)
+
+    ind3.evaluate(cache)
+    ind4.evaluate(cache)  # Evicts ind1's genome
+    assert(len(cache) == 2)
+    assert(coder.genome_key(ind1.genome) not in cache)
+    assert(coder.genome_key(ind3.genome) in cache)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+"""
+test_checkpoint.py: tests saving and loading checkpoints for Eclypse.
+"""
+
+import os
+import random
+
+import numpy as np
+
+from eclypse.ind import Individual
+from eclypse.problems import SimilarityProblem
+
+
+#def encode_genomes(genomes, dtype=None):
+#def decode_genomes(description, arrays):
+#def save_checkpoint(filename, population, generation, config=None,
+#                    best=None):
+#def load_checkpoint(filename):
+
+
+def test_checkpoint_ragged(tmp_path):
+    from eclypse.coders import FloatCoder
+    from eclypse.exec.pitt import PittPointCoder
+    from eclypse.checkpoint import save_checkpoint, load_checkpoint
+
+    coder = PittPointCoder(FloatCoder([(0.0, 1.0)] * 3), 1, 8, 2, 1)
+    population = [Individual(None, coder) for _ in range(20)]
+    population[0].fitness = 0.5
+    population[0].modified = False
+
+    filename = str(tmp_path / "pitt.ckpt")
+    random.seed(7)
+    save_checkpoint(filename, population, 12, {"note": "ragged"})
+    expected = random.random()
+    checkpoint = load_checkpoint(filename)
+    assert(os.listdir(str(tmp_path)) == ["pitt.ckpt"])
+    assert(checkpoint.generation == 12)
+    assert(checkpoint.config == {"note": "ragged"})
+    assert(isinstance(checkpoint.arrays["genes"], np.memmap))
+    for array_info in checkpoint.header["arrays"].values():
+        assert(array_info["offset"] % 64 == 0)
+
+    restored = checkpoint.individuals(None, coder)
+    assert([ind.genome for ind in restored] ==
+           [ind.genome for ind in population])
+    assert(restored[0].fitness == 0.5 and not restored[0].modified)
+    assert(restored[1].fitness is None and restored[1].modified)
+
+    checkpoint.restore_rng()
+    assert(random.random() == expected)
+
+
+def test_checkpoint_arrays(tmp_path):
+    from eclypse.coders import AdaptiveFloatCoder
+    from eclypse.checkpoint import save_checkpoint, load_checkpoint
+
+    coder = AdaptiveFloatCoder([(0.0, 1.0)] * 4)
+    population = [Individual(None, coder) for _ in range(5)]
+    filename = str(tmp_path / "es.ckpt")
+    save_checkpoint(filename, population, 1)
+
+    restored = load_checkpoint(filename).individuals(None, coder)
+    for ind, original in zip(restored, population):
+        assert((ind.genome == original.genome).all())
+        assert(ind.genome.flags.f_contiguous and ind.genome.flags.writeable)
+
+
+def test_checkpoint_best(tmp_path):
+    from eclypse.coders import BinaryCoder
+    from eclypse.checkpoint import save_checkpoint, load_checkpoint
+
+    problem = SimilarityProblem([1,1,1,1,1])  # OneMax
+    coder = BinaryCoder(5)
+    population = [Individual(problem, coder) for _ in range(4)]
+    for ind in population:
+        ind.evaluate()
+    best = Individual(problem, coder, [1,1,1,1,1])
+    best.evaluate()
+
+    filename = str(tmp_path / "best.ckpt")
+    save_checkpoint(filename, population, 2, best=best)
+    checkpoint = load_checkpoint(filename)
+    restored = checkpoint.individuals(problem, coder)
+    assert([ind.genome for ind in restored] ==
+           [ind.genome for ind in population])
+    assert([ind.fitness for ind in restored] ==
+           [ind.fitness for ind in population])
+    assert(all(type(ind.fitness) is int for ind in restored))
+
+    restored_best = checkpoint.best(problem, coder)
+    assert(restored_best.genome == [1,1,1,1,1])
+    assert(restored_best.fitness == 5 and type(restored_best.fitness) is int)
+
+    save_checkpoint(filename, population, 2)
+    assert(load_checkpoint(filename).best(problem, coder) is None)
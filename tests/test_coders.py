@@ -25,3 +25,66 @@ def test_BinaryCoder():
     print("passed")
 
 
+
+
+def test_Binary2FloatCoder_decode_population():
+    import numpy as np
+
+    bounds = [(0.0, 8.0), (-1.0, 1.0)]
+    coder = Binary2FloatCoder([3, 2], bounds)
+    assert(coder.decode_genome([1,0,1, 1,0]) == [5.0, 0.0])
+
+    gray_coder = GrayBinary2FloatCoder([3, 2], bounds)
+    assert(gray_coder.decode_genome([1,1,1, 1,1]) == [5.0, 0.0])
+
+    genomes = np.array([[1,0,1, 1,0], [0,0,0, 0,1], [1,1,1, 1,1]])
+    phenomes = coder.decode_population(genomes)
+    assert(phenomes.tolist() == [[5.0, 0.0], [0.0, -0.5], [7.0, 0.5]])
+    for genome, phenome in zip(genomes, gray_coder.decode_population(genomes)):
+        assert(gray_coder.decode_genome(genome) == phenome.tolist())
+
+
+def test_PackedBinaryCoder():
+    import pytest
+    import numpy as np
+    from eclypse.problems import SimilarityProblem
+    from eclypse.ind import Individual
+
+    coder = PackedBinaryCoder(11)
+    genome = coder.create_random_genome()
+    assert(genome.dtype == np.uint8 and len(genome) == 2)
+    assert(genome[-1] & 0x1f == 0)   # Unused bits are clear
+
+    bits = [1,0,1,1,0,0,1,0, 1,1,1]
+    genome = coder.pack(bits)
+    assert(coder.unpack(genome).tolist() == bits)
+    assert(list(coder.decode_genome(genome)) == bits)
+    phenome = coder.decode_genome(genome)
+    assert([phenome[i] for i in range(11)] == bits)
+    assert(phenome[-1] == 1 and phenome[-4] == 0)
+    assert(phenome[2:5].tolist() == bits[2:5])
+    with pytest.raises(IndexError):
+        phenome[11]
+
+    target = [1,1,1,1,1,1,1,1, 0,1,1]
+    problem = SimilarityProblem(target)
+    ind = Individual(problem, coder, genome)
+    assert(ind.evaluate() == SimilarityProblem(target).evaluate(bits) == 6)
+    phenomes = [coder.decode_genome(genome), coder.decode_genome(coder.pack(target))]
+    assert(problem.evaluate_batch(phenomes) == [6, 11])
+
+
+def test_GrayBinary2FloatCoder_tables():
+    import numpy as np
+
+    bounds = [(0.0, 1.0), (-2.0, 2.0)]
+    coder = GrayBinary2FloatCoder([7, 9], bounds)
+    genomes = np.array([coder.create_random_genome() for i in range(20)])
+    expected = [[coder.binary2int(genome[:7]) / 2.0**7,
+                 coder.binary2int(genome[7:]) / 2.0**9 * 4 - 2] 
+                for genome in genomes]
+
+    assert(coder.decode_population(genomes).tolist() == expected)
+    coder.max_table_bits = 3     # Use chunks instead
+    assert(coder.decode_population(genomes).tolist() == expected)
+    assert((7, (0.0, 1.0)) in GrayBinary2FloatCoder._float_tables)
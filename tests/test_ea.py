@@ -29,3 +29,194 @@ def test_GenerationalEA():
     print("passed")
 
 
+
+
+def test_GenerationalEA_resume(tmp_path):
+    import random
+    import numpy as np
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, UniformCrossover, Evaluate
+    from eclypse.ea import GenerationalEA
+
+    problem = SimilarityProblem([1] * 20)  # Max Ones
+    coder = BinaryCoder(20)
+
+    def run(max_gen, resume):
+        pipeline = TournamentSelection(tournament_size=2)
+        pipeline = Clone(pipeline)
+        pipeline = UniformCrossover(pipeline, p_cross=1.0, p_swap=0.5)
+        pipeline = BitFlipMutation(pipeline, p_mut=0.05)
+        pipeline = Evaluate(pipeline)
+        ea = GenerationalEA(problem, coder, pipeline, 10, max_gen,
+                            checkpoint_file=str(tmp_path / "ga.ckpt"),
+                            checkpoint_every=3)
+        population = ea.run(resume=resume)
+        return ([(ind.genome, ind.fitness, type(ind.fitness))
+                 for ind in population],
+                (ea.bsf.genome, ea.bsf.fitness, type(ea.bsf.fitness)))
+
+    random.seed(42)
+    np.random.seed(42)
+    uninterrupted = run(6, False)
+    assert(uninterrupted[1][2] is int)
+
+    random.seed(42)
+    np.random.seed(42)
+    run(3, False)
+    random.seed(0)      # The checkpoint should undo this
+    assert(run(6, True) == uninterrupted)
+
+
+def test_GenerationalEA_resume_termination(tmp_path):
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, Evaluate
+    from eclypse.termination import Stagnation, WallClock
+    from eclypse.ea import GenerationalEA
+
+    problem = SimilarityProblem([1] * 20)  # Max Ones
+    coder = BinaryCoder(20)
+
+    # Without variation the best so far never improves, so Stagnation(3)
+    # stops the run at generation 3, as long as its state is restored.
+    def run(max_gen, resume, generations):
+        pipeline = Evaluate(Clone(TournamentSelection(tournament_size=2)))
+        ea = GenerationalEA(problem, coder, pipeline, 10, max_gen,
+                            termination=Stagnation(3) | WallClock(60),
+                            checkpoint_file=str(tmp_path / "ga.ckpt"),
+                            callbacks=[lambda ea:
+                                       generations.append(ea.generation)])
+        ea.run(resume=resume)
+        return ea
+
+    generations = []
+    assert(run(None, False, generations).generation == 3)
+    assert(generations == [0, 1, 2, 3])
+
+    generations = []
+    run(2, False, generations)
+    ea = run(None, True, generations)
+    assert(ea.generation == 3)
+    assert(generations == [0, 1, 2, 3])     # Generation 2 isn't repeated
+    assert(0.0 < ea.termination.criteria[1].get_state() < 60.0)
+
+
+def test_GenerationalEA_batched():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, BatchEvaluate
+    from eclypse.survive import Elitism
+    from eclypse.ea import GenerationalEA
+
+    class CountingProblem(SimilarityProblem):
+        def evaluate_batch(self, phenomes):
+            batch_sizes.append(len(phenomes))
+            return super().evaluate_batch(phenomes)
+
+    batch_sizes = []
+    problem = CountingProblem([1] * 20)  # Max Ones
+    coder = BinaryCoder(20)
+
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = Clone(pipeline)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.05)
+    pipeline = Elitism(pipeline, num_elite=1)
+
+    history = []
+    record = lambda ea: history.append((ea.generation, ea.fitnesses().max(),
+                                        ea.bsf.fitness))
+    ea = GenerationalEA(problem, coder, pipeline, 10, 5,
+                        evaluator=BatchEvaluate(None), callbacks=[record])
+    population = ea.run()
+
+    assert(len(population) == 10 and not any(i.modified for i in population))
+    assert(len(batch_sizes) == 6)       # One call per generation
+    assert(batch_sizes[0] == 10 and max(batch_sizes[1:]) <= 9)  # Not elites
+    assert([gen for gen, best, bsf in history] == [0, 1, 2, 3, 4, 5])
+    assert(all(best == bsf for gen, best, bsf in history))  # Elitism
+
+
+def test_SteadyStateEA():
+    import random
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation
+    from eclypse.ea import SteadyStateEA
+
+    class SlowProblem(SimilarityProblem):
+        def evaluate(self, phenome):
+            time.sleep(random.random() * 0.002)   # Varying durations
+            return super().evaluate(phenome)
+
+    problem = SlowProblem([1] * 20)  # Max Ones
+    coder = BinaryCoder(20)
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = Clone(pipeline)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.05)
+
+    in_flight = []
+    record = lambda ea: in_flight.append(len(ea.pending))
+    with ThreadPoolExecutor(4) as executor:
+        ea = SteadyStateEA(problem, coder, pipeline, 10, 200,
+                           max_in_flight=4, executor=executor,
+                           callbacks=[record])
+        population = ea.run()
+
+    assert(len(population) == 10 and ea.births == 200)
+    assert(max(in_flight) <= 4 and not ea.pending)
+    assert(all(not ind.modified for ind in population))
+    assert(min(ind.fitness for ind in population) >= 10)  # Worst replaced
+    assert(ea.bsf.fitness == max(ind.fitness for ind in population))
+
+    # Only accept children that beat the member they would replace
+    def replace_if_better(population, ind):
+        i = random.randrange(len(population))
+        return i if ind.better_than(population[i]) else None
+
+    with ThreadPoolExecutor(2) as executor:
+        ea = SteadyStateEA(SimilarityProblem([1] * 20), coder, pipeline, 10,
+                           50, executor=executor, max_in_flight=2,
+                           replacement=replace_if_better)
+        ea.run()
+    assert(ea.births == 50 and len(ea.population) == 10)
+
+
+def test_SteadyStateEA_children_per_birth():
+    from concurrent.futures import ThreadPoolExecutor
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, UniformCrossover, BitFlipMutation
+    from eclypse.ea import SteadyStateEA
+
+    class CountingClone(Clone):
+        clones = 0
+
+        def generator(self):
+            for ind in super().generator():
+                CountingClone.clones += 1
+                yield ind
+
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = CountingClone(pipeline)
+    pipeline = UniformCrossover(pipeline, p_cross=1.0, p_swap=0.5)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.05)
+
+    with ThreadPoolExecutor(2) as executor:
+        ea = SteadyStateEA(SimilarityProblem([1] * 20), BinaryCoder(20),
+                           pipeline, 10, 110, max_in_flight=2,
+                           executor=executor)
+        ea.run()
+
+    # 100 children bred.  Crossover uses both children of each pair, so at
+    # most one extra parent is cloned.
+    children = ea.births - ea.pop_size
+    assert(children == 100)
+    assert(CountingClone.clones <= children + 1)
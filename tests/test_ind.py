@@ -7,5 +7,93 @@ test_individual.py: tests the individual classes for Eclypse
 
 #class Individual():  # Generic
 
-# No tests yet.
+def test_Individual():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
 
+    problem = SimilarityProblem([1,1,1,1,1])  # OneMax
+    coder = BinaryCoder(5)
+    ind1 = Individual(problem, coder, [0,0,0,0,0])
+    ind2 = Individual(problem, coder, [1,1,1,1,1])
+
+    assert(not hasattr(ind1, "__dict__"))
+    assert(ind1.context is ind2.context)
+    assert(ind1.problem is problem and ind1.genetic_coder is coder)
+
+    ind1.evaluate()
+    ind2.evaluate()
+    clone = ind2.clone()
+    assert(clone.genome == ind2.genome and clone.genome is not ind2.genome)
+    assert(clone.fitness == 5 and not clone.modified)
+    assert(ind2.better_than(ind1) and clone.equivalent_to(ind2))
+
+
+def test_Individual_size():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BaseCoder
+    from eclypse.ind import Individual, genome_size
+
+    assert(genome_size([1, [2.0, (3, None)], [[4], []]]) == 4)
+
+    coder = BaseCoder()
+    ind = Individual(SimilarityProblem([1,1,1]), coder, [[0,1], [1]])
+    assert(ind.size() == 3)
+    ind.genome[1].append(0)
+    assert(ind.size() == 3)     # cached until the individual is modified
+    ind.modified = True
+    assert(ind.size() == 4)
+    ind.genome = [[0]]
+    assert(ind.size() == 1)     # not the old genome's size
+    clone = ind.clone()
+    assert(clone.size() == 1 and clone._size[0] is clone.genome)
+
+
+def test_Individual_decode():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+
+    problem = SimilarityProblem([1,1,1])
+    coder = BinaryCoder(3)
+    inds = [Individual(problem, coder, [0,1,0]) for i in range(5)]
+    phenome = inds[0].decode()
+    assert(phenome == [0,1,0] and inds[0].decode() is phenome)
+    inds[0].genome = [1,1,1]
+    assert(inds[0].decode() == [1,1,1])
+
+    old_max = Individual.max_cached_phenomes
+    try:
+        Individual.max_cached_phenomes = 2
+        phenomes = [ind.decode() for ind in inds]
+        assert(len(Individual._phenome_owners) <= 2)
+        assert(inds[-1].decode() is phenomes[-1])
+        assert(inds[0]._phenome is None)     # evicted
+    finally:
+        Individual.max_cached_phenomes = old_max
+
+    num_cached = len(Individual._phenome_owners)
+    del inds
+    assert(len(Individual._phenome_owners) == num_cached - 2)
+
+
+def test_Individual_decode_copies():
+    import copy
+    import pickle
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+
+    problem = SimilarityProblem([1,1,1])
+    coder = BinaryCoder(3)
+    ind = Individual(problem, coder, [0,1,0])
+    ind.evaluate()
+
+    for copied in [copy.deepcopy(ind), pickle.loads(pickle.dumps(ind))]:
+        phenome = copied.decode()
+        assert(phenome == [0,1,0] and copied.decode() is phenome)
+        assert(Individual._phenome_owners[id(copied)]() is copied)
+        assert(copied.evaluate() == 1)
+        copied.modified = True
+        assert(id(copied) not in Individual._phenome_owners)
+    assert(ind.decode() == [0,1,0])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+test_islands.py: tests the island model for Eclypse.
+"""
+
+#def ring_topology(island, num_islands, epoch, seed):
+#def full_topology(island, num_islands, epoch, seed):
+#def random_topology(island, num_islands, epoch, seed):
+#class IslandModel():
+
+
+def test_topologies():
+    from eclypse.islands import ring_topology, full_topology, random_topology
+
+    assert(ring_topology(3, 4, 1, None) == [0])
+    assert(full_topology(1, 3, 1, None) == [0, 2])
+    for epoch in range(20):
+        destination = random_topology(2, 5, epoch, 7)
+        assert(destination != [2] and 0 <= destination[0] < 5)
+        assert(destination == random_topology(2, 5, epoch, 7))
+
+    # A single island has nowhere to send migrants
+    for topology in [ring_topology, full_topology, random_topology]:
+        assert(topology(0, 1, 1, 7) == [])
+
+
+def test_IslandModel():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, Evaluate
+    from eclypse.survive import Elitism
+    from eclypse.islands import IslandModel
+
+    problem = SimilarityProblem([1] * 20)  # Max Ones
+    coder = BinaryCoder(20)
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = Clone(pipeline)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.05)
+    pipeline = Evaluate(pipeline)
+    pipeline = Elitism(pipeline, num_elite=1)
+
+    for topology in ["full", "random"]:
+        model = IslandModel(problem, coder, pipeline, num_islands=3,
+                            pop_size=10, max_gen=20, migration_interval=2,
+                            num_migrants=2, topology=topology, seed=1)
+        stats = model.run()
+
+        assert([s.island for s in stats] == [0, 1, 2])
+        for s in stats:
+            assert(s.generations == 20 and len(s.mean_fitness) == 21)
+            assert(s.migrants_sent == 10 * 2 * (2 if topology == "full" else 1))
+            assert(s.best_fitness >= max(s.best_history))
+        # Every migrant sent is received, even by islands that finish first
+        assert(sum(s.migrants_received for s in stats) ==
+               sum(s.migrants_sent for s in stats))
+        assert(model.best.fitness == max(s.best_fitness for s in stats))
+        assert(len(model.report().splitlines()) == 4)
+
+
+def test_Migration_updates_bsf():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, Evaluate
+    from eclypse.ea import GenerationalEA
+    from eclypse.islands import IslandModel, IslandStats, Migration
+
+    problem = SimilarityProblem([1] * 20)  # Max Ones
+    coder = BinaryCoder(20)
+    pipeline = Evaluate(Clone(TournamentSelection(tournament_size=2)))
+    model = IslandModel(problem, coder, pipeline, num_islands=2, pop_size=5,
+                        max_gen=1)
+    ea = GenerationalEA(problem, coder, pipeline, 5, 0)
+    ea.run()
+    worst = min(ea.population, key=lambda ind: ind.fitness)
+
+    stats = IslandStats(0)
+    migrate = Migration(model, 0, [None, None], stats)
+    migrate.receive(ea, [([1] * 20, 20)])
+    assert(ea.bsf.fitness == 20 and ea.bog is ea.bsf)
+    assert(ea.bsf in ea.population and worst not in ea.population)
+    assert(stats.migrants_received == 1)
+
+
+class CrashingProblem():
+    def evaluate(self, phenome):
+        import os
+        os._exit(3)
+
+
+def test_IslandModel_crash():
+    import pytest
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, Evaluate
+    from eclypse.islands import IslandModel
+
+    pipeline = Evaluate(Clone(TournamentSelection(tournament_size=2)))
+    model = IslandModel(CrashingProblem(), BinaryCoder(5), pipeline,
+                        num_islands=2, pop_size=5, max_gen=5)
+    with pytest.raises(RuntimeError):
+        model.run()
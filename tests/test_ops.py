@@ -7,6 +7,9 @@ test_ops.py: Tests the basic operators for a pipeline system.
 #class BaseOp():
 #class Clone(BaseOp):
 #class Evaluate(BaseOp):
+#class BatchEvaluate(BaseBatchEvaluate):
+#class ParallelEvaluate(BaseBatchEvaluate):
+#class AsyncEvaluate(BaseBatchEvaluate):
 #class BaseMutationOp(BaseOp):
 #class BitFlipMutation(BaseMutationOp):
 #class GaussianMutation(BaseMutationOp):
@@ -14,6 +17,7 @@ test_ops.py: Tests the basic operators for a pipeline system.
 #class CMA_Generate(BaseOp):
 #class CMA_Update(BaseOp):
 #class UniformCrossover(BaseOp):
+#class NPointCrossover(BaseOp):
 
 
 def test_pipeline():
@@ -51,3 +55,389 @@ def test_pipeline():
         print(ind.genome, ind.fitness)
 
 
+
+
+def test_ParallelEvaluate():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import ParallelEvaluate
+
+    problem = SimilarityProblem([1,1,1,1,1])  # OneMax
+    coder = BinaryCoder(5)
+
+    population = [Individual(problem, coder, [0,0,0,0,0]),
+                  Individual(problem, coder, [0,0,0,1,1]),
+                  Individual(problem, coder, [1,1,1,1,1])]
+
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = ParallelEvaluate(pipeline, max_workers=2,
+                                batch_size=len(population))
+
+    pipeline.new_generation(population)
+    new_pop = [pipeline.pull() for i in range(len(population))]
+    pipeline.shutdown()
+
+    assert(new_pop == population)    # Order is preserved
+    assert([ind.fitness for ind in new_pop] == [0, 2, 5])
+
+
+def test_AsyncEvaluate():
+    import asyncio
+    import pytest
+    from eclypse.problems import FuncOptProblem
+    from eclypse.coders import FloatCoder
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import AsyncEvaluate
+
+    in_flight = [0, 0]   # current, max
+    async def slow_sum(phenome):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return sum(phenome)
+
+    problem = FuncOptProblem(slow_sum)
+    coder = FloatCoder([(0.0, 1.0)] * 2)
+    population = [Individual(problem, coder, [float(i), 1.0])
+                  for i in range(6)]
+
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = AsyncEvaluate(pipeline, max_in_flight=3,
+                             batch_size=len(population))
+
+    pipeline.new_generation(population)
+    new_pop = [pipeline.pull() for i in range(len(population))]
+    pipeline.shutdown()
+
+    assert([ind.fitness for ind in new_pop] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    assert(in_flight[1] == 3)
+
+    # Vectorized functions are passed a batch of one
+    def sphere(phenomes):
+        return (phenomes**2).sum(axis=1)
+
+    problem = FuncOptProblem(sphere, maximize=False, vectorized=True)
+    assert(asyncio.run(problem.evaluate_async([1.0, 2.0])) == 5.0)
+
+    # Inside a running event loop (e.g. Jupyter), a clear error is raised
+    async def run_inside_loop():
+        pipeline = AsyncEvaluate(DeterministicSelection(), batch_size=2)
+        pipeline.new_generation(population)
+        try:
+            pipeline.pull()
+        finally:
+            pipeline.shutdown()
+
+    with pytest.raises(RuntimeError, match="event loop is running"):
+        asyncio.run(run_inside_loop())
+
+
+def test_Evaluate_skips_unmodified():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import Clone, BitFlipMutation, Evaluate
+
+    class CountingProblem(SimilarityProblem):
+        num_evals = 0
+        def evaluate(self, phenome):
+            self.num_evals += 1
+            return super().evaluate(phenome)
+
+    problem = CountingProblem([1,1,1,1,1])  # OneMax
+    coder = BinaryCoder(5)
+    population = [Individual(problem, coder, [0,0,0,0,0]),
+                  Individual(problem, coder, [1,1,1,1,1])]
+    for ind in population:
+        ind.evaluate()
+    assert(problem.num_evals == 2)
+
+    # Clones that aren't mutated keep their fitness
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = Clone(pipeline)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.0)
+    pipeline = Evaluate(pipeline)
+    pipeline.new_generation(population)
+    new_pop = [pipeline.pull() for i in range(len(population))]
+    assert(problem.num_evals == 2)
+    assert([ind.fitness for ind in new_pop] == [0, 5])
+
+    # Mutated clones are evaluated
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = Clone(pipeline)
+    pipeline = BitFlipMutation(pipeline, p_mut=1.0)
+    pipeline = Evaluate(pipeline)
+    pipeline.new_generation(population)
+    new_pop = [pipeline.pull() for i in range(len(population))]
+    assert(problem.num_evals == 4)
+    assert([ind.fitness for ind in new_pop] == [5, 0])
+
+
+def test_BatchEvaluate():
+    from eclypse.problems import FuncOptProblem
+    from eclypse.coders import FloatCoder
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import BatchEvaluate
+
+    calls = []
+    def sphere(phenomes):
+        calls.append(phenomes.shape)
+        return (phenomes**2).sum(axis=1)
+
+    problem = FuncOptProblem(sphere, maximize=False, vectorized=True)
+    coder = FloatCoder([(-1.0, 1.0)] * 3)
+    population = [Individual(problem, coder, [float(i), 0.0, 1.0])
+                  for i in range(4)]
+
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = BatchEvaluate(pipeline, batch_size=len(population))
+    pipeline.new_generation(population)
+    new_pop = [pipeline.pull() for i in range(len(population))]
+
+    assert(calls == [(4, 3)])     # One call for the whole generation
+    assert([ind.fitness for ind in new_pop] == [1.0, 2.0, 5.0, 10.0])
+
+
+def test_BitFlipMutation():
+    import numpy as np
+    from eclypse.ops import BitFlipMutation, sample_mutation_sites
+
+    # The fast path should flip about p_mut * L bits
+    random_sites = [len(sample_mutation_sites(1000, 0.01)) for i in range(200)]
+    assert(8.0 < sum(random_sites) / 200.0 < 12.0)
+    assert(sample_mutation_sites(5, 1.0) == [0, 1, 2, 3, 4])
+    assert(sample_mutation_sites(5, 0.0) == [])
+    assert(sample_mutation_sites(5, 1e-17) == [])    # log(1 - p_mut) == 0
+    assert(sample_mutation_sites(5, 5e-324) == [])
+
+    mutation = BitFlipMutation(None, p_mut=1.0)
+    assert(mutation.mutate_genome([0,1,0], 1.0) == [1,0,1])
+    assert(mutation.mutate_genome([[0,1],[1]], 1.0) == [[1,0],[0]])
+
+    genomes = np.zeros((4, 3), dtype=np.int8)
+    mutation.mutate_population(genomes)
+    assert(genomes.tolist() == [[1,1,1]] * 4)
+
+    # Even after mutating a shared genome in the pipeline
+    mutation.copy_on_write = True
+    mutation.mutate_population(genomes)
+    assert(genomes.tolist() == [[0,0,0]] * 4)
+
+
+def test_UniformCrossover_arrays():
+    import numpy as np
+    from eclypse.ops import UniformCrossover
+
+    crossover = UniformCrossover(None, p_cross=1.0, p_swap=1.0)
+    genomes = np.array([[0,0,0], [1,1,1], [0,1,0], [0,1,0], [1,0,1]])
+    changed = crossover.recombine_population(genomes)
+    assert(genomes.tolist() == [[1,1,1], [0,0,0], [0,1,0], [0,1,0], [1,0,1]])
+    assert(changed.tolist() == [True, True, False, False, False])
+
+    # Multi-valued genes are swapped as a unit
+    crossover = UniformCrossover(None, p_cross=1.0, p_swap=0.5)
+    genomes = np.array([[[0,0], [0,0]], [[1,1], [1,1]]] * 50)
+    crossover.recombine_population(genomes)
+    assert((genomes[:, :, 0] == genomes[:, :, 1]).all())
+    assert((genomes[0::2] + genomes[1::2] == 1).all())
+    assert(0 < genomes[0::2].sum() < 200)
+
+
+def test_NPointCrossover():
+    import numpy as np
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.ops import NPointCrossover
+
+    problem = SimilarityProblem([1] * 10)  # OneMax
+    coder = BinaryCoder(10)
+    crossover = NPointCrossover(None, p_cross=1.0, num_points=2)
+
+    for genome_type in [list, np.array]:
+        ind1 = Individual(problem, coder, genome_type([0] * 10))
+        ind2 = Individual(problem, coder, genome_type([1] * 10))
+        crossover.recombine(ind1, ind2)
+        assert(type(ind1.genome) == type(genome_type([0])))
+        genome1 = list(ind1.genome)
+        assert(sum(genome1) + sum(ind2.genome) == 10)
+        # Two points give at most three segments
+        assert(sum(a != b for a, b in zip(genome1, genome1[1:])) <= 2)
+
+    genomes = np.array([[0] * 10, [1] * 10] * 20)
+    changed = crossover.recombine_population(genomes)
+    assert((genomes[0::2] + genomes[1::2] == 1).all())
+    assert(changed.all())
+    for genome in genomes:
+        assert(np.count_nonzero(np.diff(genome)) <= 2)
+
+
+def test_packed_operators():
+    import numpy as np
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import PackedBinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.ops import PackedBitFlipMutation, PackedUniformCrossover
+
+    coder = PackedBinaryCoder(12)
+    problem = SimilarityProblem([1] * 12)  # OneMax
+
+    mutation = PackedBitFlipMutation(None, p_mut=1.0)
+    genome = coder.pack([0] * 12)
+    assert(mutation.mutate_genome(genome, 12, 1.0) == 12)
+    assert(coder.unpack(genome).tolist() == [1] * 12)
+    assert(genome[-1] & 0x0f == 0)
+
+    crossover = PackedUniformCrossover(None, p_cross=1.0, p_swap=0.5)
+    ind1 = Individual(problem, coder, coder.pack([0] * 12))
+    ind2 = Individual(problem, coder, coder.pack([1] * 12))
+    crossover.recombine(ind1, ind2)
+    bits1 = coder.unpack(ind1.genome)
+    bits2 = coder.unpack(ind2.genome)
+    assert((bits1 + bits2 == 1).all())
+    assert(ind1.evaluate() + ind2.evaluate() == 12)
+
+
+def test_AdaptiveMutation():
+    import numpy as np
+    from eclypse.coders import AdaptiveFloatCoder
+    from eclypse.ops import AdaptiveMutation
+
+    coder = AdaptiveFloatCoder([(-1.0, 1.0)] * 5, init_sigmas=[0.5] * 5)
+    genome = coder.create_random_genome()
+    assert(genome.shape == (5, 2) and genome[:, 1].flags.contiguous)
+    assert(coder.decode_genome(genome) == genome[:, 0].tolist())
+
+    mutation = AdaptiveMutation(None, [(0.1, 0.6)] * 5)
+    new_genome = mutation.mutate_genome(genome)
+    assert(new_genome.shape == (5, 2) and new_genome[:, 0].flags.contiguous)
+    assert(not np.array_equal(new_genome[:, 0], genome[:, 0]))
+    assert(((0.1 <= new_genome[:, 1]) & (new_genome[:, 1] <= 0.6)).all())
+
+    # Old style genomes, and whole populations
+    new_genome = mutation.mutate_genome([(0.0, 0.5)] * 5)
+    assert(new_genome.shape == (5, 2))
+    genomes = np.array([genome] * 10)
+    new_genomes = mutation.mutate_population(genomes)
+    assert(new_genomes.shape == (10, 5, 2))
+    assert(((0.1 <= new_genomes[:, :, 1]) & (new_genomes[:, :, 1] <= 0.6)).all())
+
+
+def test_Clone_copy_on_write():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import Clone, BitFlipMutation, UniformCrossover
+
+    problem = SimilarityProblem([1] * 4)
+    coder = BinaryCoder(4)
+    genome1 = [[0,0], [0,0], [0,0], [0,0]]   # A nested genome
+    genome2 = [[1,1], [1,1], [1,1], [1,1]]
+    parent1 = Individual(problem, coder, genome1)
+    parent2 = Individual(problem, coder, genome2)
+
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = Clone(pipeline, copy_on_write=True)
+    pipeline = UniformCrossover(pipeline, p_cross=1.0, p_swap=0.5)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.2)
+    pipeline.new_generation([parent1, parent2])
+    children = [pipeline.pull() for i in range(20)]
+
+    # The parents are untouched, and unchanged rules are still shared
+    assert(parent1.genome is genome1 and genome1 == [[0,0]] * 4)
+    assert(parent2.genome is genome2 and genome2 == [[1,1]] * 4)
+    parent_rules = [id(rule) for rule in genome1 + genome2]
+    num_shared = sum(id(rule) in parent_rules
+                     for child in children for rule in child.genome)
+    for child in children:
+        for rule in child.genome:
+            if id(rule) in parent_rules:
+                assert(rule in ([0,0], [1,1]))
+    assert(0 < num_shared < 80)
+
+
+def test_crossover_one_shared_parent():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import BitFlipMutation, UniformCrossover, NPointCrossover
+
+    problem = SimilarityProblem([1] * 4)
+    coder = BinaryCoder(4)
+    uniform = UniformCrossover(None, p_cross=1.0, p_swap=1.0)
+    npoint = NPointCrossover(None, p_cross=1.0, num_points=1)
+    crossovers = [uniform.recombine_lists, npoint.recombine]
+    for recombine in crossovers:
+        parent = Individual(problem, coder, [[0,0], [0,0], [0,0], [0,0]])
+        child1 = parent.clone(copy_on_write=True)
+        child2 = Individual(problem, coder, [[1,1], [1,1], [1,1], [1,1]])
+        recombine(child1, child2)
+        assert(child1.shared_genome and child2.shared_genome)
+
+        # So mutating either child leaves the parent alone
+        pipeline = DeterministicSelection(shuffle=False)
+        pipeline = BitFlipMutation(pipeline, p_mut=1.0)
+        pipeline.new_generation([child1, child2])
+        pipeline.pull(), pipeline.pull()
+        assert(parent.genome == [[0,0]] * 4)
+
+
+def test_BitFlipMutation_e_mut():
+    import random
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BaseCoder
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import BitFlipMutation
+
+    random.seed(1)
+    coder = BaseCoder()
+    ind = Individual(SimilarityProblem([0]*20), coder, [[0]*10, [0]*10])
+    ind.modified = False
+    mutate = BitFlipMutation(DeterministicSelection(), e_mut=20)  # p_mut = 1
+    mutate.new_generation([ind])
+    mutant = mutate.pull()
+    assert(mutant.genome == [[1]*10, [1]*10] and mutant.modified)
+
+
+def test_BatchEvaluate_with_Elitism():
+    import pytest
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ind import Individual
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, BatchEvaluate
+    from eclypse.survive import Elitism
+
+    problem = SimilarityProblem([1] * 10)  # Max Ones
+    coder = BinaryCoder(10)
+    population = [Individual(problem, coder) for i in range(10)]
+    for ind in population:
+        ind.evaluate()
+
+    def make_pipeline(batch_size):
+        pipeline = TournamentSelection(tournament_size=2)
+        pipeline = Clone(pipeline)
+        pipeline = BitFlipMutation(pipeline, p_mut=1.0)  # Always modified
+        evaluator = BatchEvaluate(pipeline, batch_size=batch_size)
+        return evaluator, Elitism(evaluator, num_elite=2)
+
+    # Elitism supplies 2 individuals, so only 8 are pulled through
+    evaluator, pipeline = make_pipeline(batch_size=8)
+    for generation in range(5):
+        pipeline.new_generation(population)
+        population = [pipeline.pull() for i in range(10)]
+    assert(evaluator.evaluations == 5 * 8)
+
+    evaluator, pipeline = make_pipeline(batch_size=None)
+    pipeline.new_generation(population)
+    with pytest.raises(ValueError):
+        [pipeline.pull() for i in range(10)]
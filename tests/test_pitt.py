@@ -83,6 +83,76 @@ def test_PittPointCoder():
 
 
 
+def test_Pitt_copy_genome():
+    """
+    Test the fast structural genome copy.
+    """
+    from eclypse.coders import AdaptiveFloatCoder
+
+    ruleCoder = FloatCoder([(0.0, 1.0)] * 3)
+    coder = PittBoundsCoder(ruleCoder, 5, 5, 1, 1)
+    genome = coder.create_random_genome()
+    copy = coder.copy_genome(genome)
+    assert(copy == genome and copy is not genome)
+    assert(all(c is not g for c, g in zip(copy, genome)))
+
+    ruleCoder = AdaptiveFloatCoder([(0.0, 1.0)] * 3)
+    coder = PittBoundsCoder(ruleCoder, 5, 5, 1, 1)
+    genome = coder.create_random_genome()
+    copy = coder.copy_genome(genome)
+    for c, g in zip(copy, genome):
+        assert((c == g).all() and c is not g)
+        assert(c.flags.f_contiguous)
+
+
+
+def test_Pitt_decode_cache():
+    """
+    Test that decoded rule sets are cached and reset between uses.
+    """
+    from eclypse.ind import Individual
+
+    ruleCoder = FloatCoder([(0.0, 1.0)] * 4)
+    coder = PittPointCoder(ruleCoder, 2, 2, 2, 1, init_mem=[0.0],
+                           nearest_neighbor=True)
+    ind = Individual(SimpleProblem(), coder,
+                     [[0.0, 0.0, 0.0, 0.0, 0.0, 1.0],
+                      [1.0, 1.0, 0.0, 1.0, 1.0, 0.0]])
+    phenome = ind.decode()
+    phenome.execute([1.0, 1.0])
+    assert(phenome.memRegs == [0.0])
+    phenome.memRegs = [1.0]
+    assert(ind.decode() is phenome and phenome.memRegs == [0.0])
+
+    ind.modified = True
+    assert(ind.decode() is not phenome)
+    ind.genome = coder.copy_genome(ind.genome)
+    assert(ind.decode() is not ind.clone().decode())
+
+
+def test_PittUniformCrossover_shared():
+    """
+    Test that rules transferred from a shared genome are marked as shared.
+    """
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.exec.pitt import PittUniformCrossover
+
+    ruleCoder = FloatCoder([(0.0, 1.0)] * 3)
+    coder = PittBoundsCoder(ruleCoder, 2, 2, 1, 1)
+    parent = Individual(None, coder)
+    mother = parent.clone(copy_on_write=True)
+    father = Individual(None, coder)
+
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = PittUniformCrossover(pipeline, p_cross=1.0, p_xfer=1.0)
+    pipeline.new_generation([mother, father])
+    pipeline.pull()
+    assert(mother.shared_genome and father.shared_genome)
+
+
+
 if __name__ == "__main__":
     test_PittBoundsCoder()
     test_PittPointCoder()
+    test_Pitt_copy_genome()
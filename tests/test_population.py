@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+test_population.py: tests the array based population class for Eclypse
+"""
+
+import numpy as np
+
+from eclypse.problems import SimilarityProblem
+from eclypse.coders import BinaryCoder
+from eclypse.population import Population
+
+
+def test_Population():
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, UniformCrossover, Evaluate
+    from eclypse.survive import Elitism
+
+    problem = SimilarityProblem([1] * 20)  # OneMax
+    coder = BinaryCoder(20)
+    population = Population.random(problem, coder, 10)
+    assert(population.genomes.shape == (10, 20))
+    assert(population.genomes.dtype == np.int8)
+
+    population.evaluate()
+    assert(population.fitness.tolist() == population.genomes.sum(axis=1).tolist())
+    assert(population[3].fitness == population.fitness[3])
+    assert(type(population[3].fitness) is int)     # As Individual gives
+
+    # Views work with the standard pipeline
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = Clone(pipeline)
+    pipeline = UniformCrossover(pipeline, p_cross=1.0)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.1)
+    pipeline = Evaluate(pipeline)
+    pipeline = Elitism(pipeline, num_elite=1)
+
+    old_genomes = population.genomes.copy()
+    pipeline.new_generation(population)
+    offspring = [pipeline.pull() for _ in range(len(population))]
+    assert(np.array_equal(population.genomes, old_genomes))  # parents intact
+
+    new_population = Population.from_individuals(offspring)
+    assert(new_population.fitness.max() >= population.fitness.max())
+    assert(not new_population.modified.any())
+
+
+def test_SharedPopulation():
+    from eclypse.ind import Individual
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import ParallelEvaluate
+    from eclypse.population import SharedPopulation, shared_executor
+
+    problem = SimilarityProblem([1] * 20)  # OneMax
+    coder = BinaryCoder(20)
+    genomes = [coder.create_random_genome() for i in range(30)]
+
+    executor = shared_executor(problem, coder, max_workers=2)
+    with SharedPopulation(problem, coder, genomes) as population:
+        population.evaluate_parallel(executor, chunk_size=7)
+        assert(population.fitness.tolist() == [sum(g) for g in genomes])
+        assert(not population.modified.any())
+    executor.shutdown()
+
+    # As an option of ParallelEvaluate
+    individuals = [Individual(problem, coder, g) for g in genomes]
+    pipeline = DeterministicSelection(shuffle=False)
+    pipeline = ParallelEvaluate(pipeline, max_workers=2, shared_memory=True,
+                                batch_size=len(individuals))
+    for generation in range(2):
+        for ind in individuals:
+            ind.modified = True
+        pipeline.new_generation(individuals)
+        new_pop = [pipeline.pull() for i in range(len(individuals))]
+    pipeline.shutdown()
+    assert([ind.fitness for ind in new_pop] == [sum(g) for g in genomes])
+    assert(all(type(ind.fitness) is int for ind in new_pop))
+
+    # Other fitnesses stay floats
+    population = Population(problem, coder, genomes[:2], [1, 2.5])
+    assert(population[0].fitness == 1.0)
+    assert(type(population[0].fitness) is float)
+
+
+def test_IndividualView_mutation():
+    from eclypse.select import DeterministicSelection
+    from eclypse.ops import BitFlipMutation
+
+    problem = SimilarityProblem([1] * 20)  # OneMax
+    coder = BinaryCoder(20)
+    population = Population.random(problem, coder, 10)
+    assert(not population[0].shared_genome)
+
+    # Without a Clone, the views' genomes are mutated in place
+    old_genomes = population.genomes.copy()
+    pipeline = BitFlipMutation(DeterministicSelection(shuffle=False),
+                               p_mut=1.0)
+    pipeline.new_generation(population)
+    mutated = [pipeline.pull() for _ in range(len(population))]
+    assert(np.array_equal(population.genomes, 1 - old_genomes))
+    assert(all(ind.modified for ind in mutated))
@@ -24,3 +24,27 @@ def test_SimilarityProblem():
     print("passed")
 
 
+
+
+def test_SimilarityProblem_evaluate_batch():
+    problem = SimilarityProblem([1,1,1,1,1])
+    phenomes = [[1,0,1,0,1], [1,1,1,1,1]]
+    assert(problem.evaluate_batch(phenomes) == [3, 5])
+
+    # Only as many genes as both have are compared, as in evaluate()
+    longer = [[1,0,1,0,1,1,1], [1,1,1,1,1,0,0]]
+    assert(problem.evaluate_batch(longer) ==
+           [problem.evaluate(p) for p in longer] == [3, 5])
+    shorter = [[1,0,1], [1,1,1]]
+    assert(problem.evaluate_batch(shorter) ==
+           [problem.evaluate(p) for p in shorter] == [2, 3])
+
+    # Anything but a rectangular array of numbers goes through evaluate()
+    ragged = [[1,0,1], [1,1,1,1,1], []]
+    assert(problem.evaluate_batch(ragged) == [2, 5, 0])
+    problem = SimilarityProblem("hello")
+    words = ["help!", "hello", "hi"]
+    assert(problem.evaluate_batch(words) ==
+           [problem.evaluate(w) for w in words] == [3, 5, 1])
+    assert(problem.evaluate_batch([list(w) for w in words]) == [3, 5, 1])
+    assert(problem.evaluate_batch([]) == [])
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""
+test_profiler.py: tests the pipeline profiler for Eclypse.
+"""
+
+#class PipelineProfiler():
+#def pipeline_tree(pipeline):
+
+
+def test_PipelineProfiler():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, Evaluate
+    from eclypse.ea import GenerationalEA
+    from eclypse.profiler import PipelineProfiler
+
+    selection = TournamentSelection(tournament_size=2)
+    pipeline = Clone(selection)
+    pipeline = BitFlipMutation(pipeline, p_mut=0.05)
+    pipeline = Evaluate(pipeline)
+
+    profiler = PipelineProfiler(pipeline, track_allocations=True)
+    labels = [label for depth, label, op in profiler.tree]
+    assert(labels == ["Evaluate", "BitFlipMutation", "Clone",
+                      "TournamentSelection",
+                      "DeterministicSelection (det_select)"])
+
+    with profiler:
+        ea = GenerationalEA(SimilarityProblem([1] * 20), BinaryCoder(20),
+                            pipeline, 10, 5, callbacks=[profiler])
+        ea.run()
+    assert("pull" not in vars(pipeline))    # Wrappers removed
+
+    assert(len(profiler.history) == 6)      # Including generation 0
+    assert(profiler.history[0][pipeline].pulls == 0)
+    assert(profiler.history[1][pipeline].pulls == 10)
+    totals = profiler.totals
+    assert(totals[pipeline].pulls == 50 and totals[selection].pulls == 50)
+    assert(totals[selection.det_select].pulls == 100)
+    for op in profiler.ops:
+        assert(0 <= totals[op].exclusive <= totals[op].cumulative + 1e-9)
+    total_exclusive = sum(totals[op].exclusive for op in profiler.ops)
+    assert(abs(total_exclusive - totals[pipeline].cumulative) < 1e-6)
+
+    report = profiler.report().splitlines()
+    assert(len(report) == 6 and report[2].startswith("  BitFlipMutation"))
+    assert("alloc" in report[0])
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+test_termination.py: tests the stopping criteria for Eclypse.
+"""
+
+
+#class TargetFitness(BaseTermination):
+#class Stagnation(BaseTermination):
+#class MaxEvaluations(BaseTermination):
+#class WallClock(BaseTermination):
+#class DiversityCollapse(BaseTermination):
+
+
+def counting_problem(target):
+    from eclypse.problems import SimilarityProblem
+
+    class CountingProblem(SimilarityProblem):
+        def __init__(self, target):
+            super().__init__(target)
+            self.calls = 0
+
+        def evaluate(self, phenome):
+            self.calls += 1
+            return super().evaluate(phenome)
+
+    return CountingProblem(target)
+
+
+def make_pipeline(p_mut=0.05, evaluate=True):
+    from eclypse.select import TournamentSelection
+    from eclypse.ops import Clone, BitFlipMutation, Evaluate
+
+    pipeline = TournamentSelection(tournament_size=2)
+    pipeline = Clone(pipeline)
+    pipeline = BitFlipMutation(pipeline, p_mut=p_mut)
+    if evaluate:
+        pipeline = Evaluate(pipeline)
+    return pipeline
+
+
+def test_TargetFitness():
+    from eclypse.coders import BinaryCoder
+    from eclypse.ea import GenerationalEA
+    from eclypse.termination import TargetFitness, MaxEvaluations
+
+    problem = counting_problem([1] * 20)  # Max Ones
+    ea = GenerationalEA(problem, BinaryCoder(20), make_pipeline(), 20, 1000,
+                        termination=TargetFitness(20) | MaxEvaluations(10**5))
+    ea.run()
+    assert(ea.bsf.fitness == 20 and ea.generation < 1000)
+    assert(ea.evaluations == problem.calls)
+
+
+def test_MaxEvaluations():
+    from eclypse.coders import BinaryCoder
+    from eclypse.ea import GenerationalEA
+    from eclypse.termination import MaxEvaluations
+
+    problem = counting_problem([1] * 20)
+    ea = GenerationalEA(problem, BinaryCoder(20), make_pipeline(), 10, None,
+                        termination=MaxEvaluations(100))
+    ea.run()
+    assert(ea.evaluations == problem.calls)
+    assert(100 <= ea.evaluations < 110)     # Stops within a generation
+
+    # The budget is checked between generations, so it can be overshot.
+    # With p_mut=1.0 every child is evaluated: 20 per generation.
+    problem = counting_problem([1] * 20)
+    ea = GenerationalEA(problem, BinaryCoder(20), make_pipeline(1.0), 20,
+                        None, termination=MaxEvaluations(110))
+    ea.run()
+    assert(ea.generation == 5 and ea.evaluations == problem.calls == 120)
+
+
+def test_Stagnation_and_DiversityCollapse():
+    from eclypse.problems import SimilarityProblem
+    from eclypse.coders import BinaryCoder
+    from eclypse.ea import GenerationalEA
+    from eclypse.termination import Stagnation, DiversityCollapse, WallClock
+    from eclypse.termination import population_diversity
+
+    # Without mutation, tournament selection soon takes over
+    problem = SimilarityProblem([1] * 20)
+    ea = GenerationalEA(problem, BinaryCoder(20), make_pipeline(0.0), 10,
+                        None, termination=DiversityCollapse(0.0) &
+                                          Stagnation(2) | WallClock(10))
+    ea.run()
+    assert(population_diversity(ea.population) == 0.0)
+    assert(ea.generation >= 2)
+
+
+def test_SteadyStateEA_termination():
+    from concurrent.futures import ThreadPoolExecutor
+    from eclypse.coders import BinaryCoder
+    from eclypse.ea import SteadyStateEA
+    from eclypse.termination import MaxEvaluations
+
+    problem = counting_problem([1] * 20)
+    with ThreadPoolExecutor(2) as executor:
+        ea = SteadyStateEA(problem, BinaryCoder(20),
+                           make_pipeline(evaluate=False), 10, None,
+                           max_in_flight=2, executor=executor,
+                           termination=MaxEvaluations(50))
+        ea.run()
+    assert(50 <= ea.evaluations <= 51 and problem.calls <= 52)